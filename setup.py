@@ -2,6 +2,10 @@ import codecs
 from setuptools import setup, find_packages
 
 entry_points = {
+    'console_scripts': [
+        'nti_app_benchmark = nti.app.testing.benchmark:main',
+        'nti_app_replay = nti.app.testing.replay:main',
+    ],
 }
 
 
@@ -57,6 +61,7 @@ setup(
         'pyramid',
         'pyramid-mailer',
         'repoze.sendmail',
+        'repoze.who',
         'simplejson',
         'six',
         'transaction',
@@ -72,7 +77,13 @@ setup(
             'Sphinx',
             'repoze.sphinx.autointerface',
             'sphinx_rtd_theme',
-        ]
+        ],
+        'scheduling': [
+            'nose2',
+        ],
+        'test': [
+            'zope.testrunner',
+        ],
     },
     entry_points=entry_points,
 )
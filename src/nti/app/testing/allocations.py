@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tracking the memory allocated by individual requests with
+:mod:`tracemalloc`.
+
+When enabled, the pipeline built by
+:func:`nti.app.testing.webtest.TestApp` attaches an
+:class:`AllocationStats` to each response as ``allocation_stats``;
+matchers like :func:`nti.app.testing.matchers.allocates_at_most` check
+it.
+
+Enable it by setting the environment variable named by
+:data:`TRACE_ALLOCATIONS_ENV`, or by passing ``trace_allocations`` to
+``TestApp``. Tracing makes requests several times slower. It
+requires Python 3: on Python 2, passing ``trace_allocations`` fails, and the
+environment variable is ignored with a warning, so the matchers report
+that nothing was recorded.
+
+If tracing is not already on, it is started for each request and
+stopped again when the request is done, so nothing else in the process
+pays for it.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import os
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    # Python 2
+    tracemalloc = None
+
+__test__ = False
+
+#: The name of an environment variable. If it is set to a non-empty
+#: value, the allocations of all test requests are traced.
+TRACE_ALLOCATIONS_ENV = 'NTI_APP_TESTING_TRACE_ALLOCATIONS'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def trace_allocations_enabled():
+    if not os.environ.get(TRACE_ALLOCATIONS_ENV):
+        return False
+    if tracemalloc is None:  # pragma: no cover
+        logger.warning("Ignoring %s: tracing allocations requires tracemalloc",
+                       TRACE_ALLOCATIONS_ENV)
+        return False
+    return True
+
+
+def require_tracemalloc():
+    """
+    Raise :exc:`NotImplementedError` if allocations can't be traced.
+    """
+    if tracemalloc is None:  # pragma: no cover
+        raise NotImplementedError("Tracing allocations requires tracemalloc")
+
+
+class AllocationStats(object):
+    """
+    The memory allocated by one request.
+
+    ``peak`` is the most memory, in bytes, that the request had
+    allocated at once; ``net`` is how much of that was still allocated
+    when it finished. ``top`` is a list of the sites (``file:line``) that
+    grew the most, as ``(site, bytes, count)`` tuples.
+    """
+
+    peak = 0
+    net = 0
+    top = ()
+
+    def to_dict(self):
+        return {
+            'peak': self.peak,
+            'net': self.net,
+            'top': list(self.top),
+        }
+
+    def __repr__(self):
+        return '<%s peak=%s net=%s>' % (type(self).__name__,
+                                        self.peak, self.net)
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__),))
+
+
+def _sites(statistics, top):
+    return [('%s:%s' % (stat.traceback[0].filename, stat.traceback[0].lineno),
+             size, count)
+            for stat, size, count in statistics[:top]
+            if size > 0]
+
+
+def measure_allocations(app, environ, start_response, top=10):
+    """
+    Call the WSGI *app* and return its result and the
+    :class:`AllocationStats` of the request, with at most *top* sites.
+
+    If tracing is not on, it is on only while *app* runs; everything
+    traced was then allocated by the request, so only one snapshot is
+    needed to find the sites. No snapshot is taken if *top* is 0.
+    """
+    require_tracemalloc()
+    stats = AllocationStats()
+    started = not tracemalloc.is_tracing()
+    before = None
+    if started:
+        tracemalloc.start()
+    else:
+        if top:
+            before = _snapshot()
+        reset_peak = getattr(tracemalloc, 'reset_peak', None)
+        if reset_peak is not None:
+            reset_peak()
+    start, peak = tracemalloc.get_traced_memory()
+    try:
+        result = app(environ, start_response)
+    finally:
+        try:
+            current, peak = tracemalloc.get_traced_memory()
+            stats.net = current - start
+            # If tracing was already on without reset_peak (before Python
+            # 3.9), this is only right if the request reached a new high.
+            stats.peak = max(peak - start, stats.net)
+            if top and before is None:
+                stats.top = _sites([(s, s.size, s.count)
+                                    for s in _snapshot().statistics('lineno')],
+                                   top)
+            elif top:
+                stats.top = _sites([(d, d.size_diff, d.count_diff)
+                                    for d in _snapshot().compare_to(before, 'lineno')],
+                                   top)
+        finally:
+            if started:
+                tracemalloc.stop()
+    return result, stats
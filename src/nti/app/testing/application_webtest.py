@@ -18,6 +18,14 @@ patch_pyramid_on_import.patch()
 # disable: accessing protected members, too many methods
 # pylint: disable=W0212,R0904
 import gc
+import os
+import base64
+import time
+import contextlib
+
+from hamcrest import assert_that
+from hamcrest import described_as
+from hamcrest import less_than_or_equal_to
 
 from six.moves import urllib_parse
 
@@ -32,27 +40,106 @@ from nti.app.testing.base import TestBaseMixin
 from nti.app.testing.base import ConfiguringTestBase
 from nti.app.testing.base import SharedConfiguringTestBase
 
-from nti.appserver.application import createApplication  # TODO: Break this dep
+from nti.app.testing.harness import nearest_rank
 
-try:
-    from nti.contentlibrary.filesystem import StaticFilesystemLibrary as Library
-except ImportError:  # pragma: no cover
-    class Library(object):
-        pass
+from nti.app.testing.redis_client import redis_snapshot
+from nti.app.testing.redis_client import count_redis_calls
+from nti.app.testing.redis_client import CountingRedisClient
+from nti.app.testing.redis_client import stop_counting_redis_calls
+from nti.app.testing.redis_client import redis_isolation_enabled
+from nti.app.testing.redis_client import redis_registrations
 
-from nti.dataserver.interfaces import IDataserver
+from nti.app.testing.storage import snapshot_directory
+from nti.app.testing.storage import snapshot_fingerprint
+from nti.app.testing.storage import save_storage_snapshot
+from nti.app.testing.storage import load_storage_snapshot
 
-from nti.dataserver.tests import mock_dataserver
+from nti.app.testing.timing import timed_phase
+from nti.app.testing.timing import phase_timings
+
+from nti.app.testing.zcml import cached_actions
+from nti.app.testing.zcml import action_cache_enabled
+
+from nti.dataserver.interfaces import IDataserver
 
 from nti.ntiids import ntiids
 
 from nti.property.property import alias
 
+import zope.deferredimport
+zope.deferredimport.initialize()
+zope.deferredimport.define(
+    Library='nti.contentlibrary.filesystem:StaticFilesystemLibrary')
+
 UQ = urllib_parse.quote
 
+#: The name of an environment variable. If it is set to a non-empty
+#: value, application tests cache the service document; see
+#: :attr:`_AppTestBaseMixin.cache_service_doc`.
+CACHE_SERVICE_DOC_ENV = 'NTI_APP_TESTING_CACHE_SERVICE_DOC'
+
 logger = __import__('logging').getLogger(__name__)
 
 
+class _NoLibrary(object):
+    pass
+
+
+def _create_library():
+    # nti.contentlibrary is large, and not every test needs it,
+    # so import it only when we need a library.
+    try:
+        from nti.contentlibrary.filesystem import StaticFilesystemLibrary
+    except ImportError:  # pragma: no cover
+        return _NoLibrary()
+    return StaticFilesystemLibrary()
+
+
+def _createApplication(*args, **kwargs):
+    # Importing this imports everything in the application;
+    # only pay that price when needed.
+    from nti.appserver.application import createApplication  # TODO: Break this dep
+    return createApplication(*args, **kwargs)
+
+
+def _basic_authorization(user, password):
+    credentials = (u'%s:%s' % (user, password)).encode('utf-8')
+    return str('Basic ' + base64.b64encode(credentials).decode('ascii'))
+
+
+#: Maps ``(user, password, origin)`` to the environment
+#: :meth:`_AppTestBaseMixin._make_extra_environ` starts from.
+_extra_environ_templates = {}
+
+
+def _extra_environ_template(user, password, origin):
+    key = (user, password, origin)
+    template = _extra_environ_templates.get(key)
+    if template is None:
+        template = _extra_environ_templates[key] = {
+            'HTTP_AUTHORIZATION': _basic_authorization(user, password),
+            'HTTP_ORIGIN': origin,  # To trigger CORS
+            'HTTP_USER_AGENT': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_7_3) AppleWebKit/537.6 (KHTML, like Gecko) Chrome/23.0.1239.0 Safari/537.6',
+            # Cause paste to throw everything in case it gets in the
+            # pipeline
+            'paste.throw_errors': True,
+            'paste.testing': True,  # Let lower layers know we're testing
+            # WebTest by default sets a content type of 'application/x-www-form-urlencoded'
+            # if we do not otherwise specify one, but does not otherwise mess with the body.
+            # If you happen to access request.POST, though, (like locale negotiation does, or
+            # certain template operations do) the underlying WebOb will notice the content-type
+            # and attempt to decode the body based on that. This leads to a badly corrupted
+            # body (if it was JSON) and mysterious failures. This has even been seen in the real
+            # world, when clients neglected to set a content type; apparently browsers also
+            # default to this content type. An internal implementation change (accessing PUT) suddenly meant
+            # that we couldn't read their body. So we default to something sensible here, but the real
+            # fix is to avoid calling put() with already stringified JSON
+            # and use put_json
+            'CONTENT_TYPE': 'text/plain',
+        }
+    return template
+
+
 class _AppTestBaseMixin(TestBaseMixin):
     """
     A mixin that exposes knowledge about how
@@ -65,6 +152,15 @@ class _AppTestBaseMixin(TestBaseMixin):
 
     testapp = None
 
+    #: If true, :meth:`fetch_service_doc` returns the service document it
+    #: fetched earlier in the test for the same test app and user, unless
+    #: a transaction has been committed to the database of the dataserver
+    #: since, whether by a request or directly.
+    #: Defaults to the value of the environment variable named by
+    #: :data:`CACHE_SERVICE_DOC_ENV`.
+    cache_service_doc = bool(os.environ.get(CACHE_SERVICE_DOC_ENV))
+    _service_docs = None
+
     def _make_extra_environ(self, user=None, update_request=False, **kwargs):
         """
         The default username is a case-modified version of the default user in :meth:`_create_user`,
@@ -80,27 +176,8 @@ class _AppTestBaseMixin(TestBaseMixin):
         # As of WebTest 2.0.15, see also TestApp.authorization:
         #  app.authorization = ('Basic', ('user', 'password'))
         user = user.replace('@', "%40")
-        result = {
-            'HTTP_AUTHORIZATION': 'Basic ' + (user + ':%s' % password).encode('base64'),
-            'HTTP_ORIGIN': self.default_origin,  # To trigger CORS
-            'HTTP_USER_AGENT': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_7_3) AppleWebKit/537.6 (KHTML, like Gecko) Chrome/23.0.1239.0 Safari/537.6',
-            # Cause paste to throw everything in case it gets in the
-            # pipeline
-            'paste.throw_errors': True,
-            'paste.testing': True,  # Let lower layers know we're testing
-            # WebTest by default sets a content type of 'application/x-www-form-urlencoded'
-            # if we do not otherwise specify one, but does not otherwise mess with the body.
-            # If you happen to access request.POST, though, (like locale negotiation does, or
-            # certain template operations do) the underlying WebOb will notice the content-type
-            # and attempt to decode the body based on that. This leads to a badly corrupted
-            # body (if it was JSON) and mysterious failures. This has even been seen in the real
-            # world, when clients neglected to set a content type; apparently browsers also
-            # default to this content type. An internal implementation change (accessing PUT) suddenly meant
-            # that we couldn't read their body. So we default to something sensible here, but the real
-            # fix is to avoid calling put() with already stringified JSON
-            # and use put_json
-            'CONTENT_TYPE': 'text/plain',
-        }
+        result = dict(_extra_environ_template(user, password,
+                                              self.default_origin))
         for k, v in kwargs.items():
             k = str(k)
             k.replace('_', '-')
@@ -135,10 +212,37 @@ class _AppTestBaseMixin(TestBaseMixin):
     def resolve_user(self, *args, **kwargs):
         return self.resolve_user_response(*args, **kwargs).json_body['Items'][0]
 
-    def fetch_service_doc(self, testapp=None):
+    def fetch_service_doc(self, testapp=None, cached=None):
+        """
+        Fetch the service document with *testapp* (``self.testapp``
+        by default).
+
+        :keyword bool cached: Whether to return the response fetched earlier
+            in the test; defaults to :attr:`cache_service_doc`.
+        """
         if testapp is None:
             testapp = self.testapp
-        return testapp.get('/dataserver2')
+        if cached is None:
+            cached = self.cache_service_doc
+        db = getattr(self.ds, 'db', None)
+        if not cached or db is None:
+            return testapp.get('/dataserver2')
+
+        if self._service_docs is None:
+            self._service_docs = {}
+        # The user is in the environment or the cookies
+        key = (id(testapp),
+               testapp.extra_environ.get('HTTP_AUTHORIZATION'),
+               tuple(sorted(testapp.cookies.items())))
+        entry = self._service_docs.get(key)
+        if (   entry is None
+            or entry[0] is not testapp
+            or entry[1] != db.lastTransaction()):
+            res = testapp.get('/dataserver2')
+            # After the request, in case it committed
+            entry = self._service_docs[key] = (testapp, db.lastTransaction(),
+                                               res)
+        return entry[2]
 
     def post_user_data(self, ext_obj, testapp=None, username=None, extra_path='', **kwargs):
         """
@@ -205,9 +309,120 @@ class _AppTestBaseMixin(TestBaseMixin):
                                     testapp=testapp,
                                     username=username,
                                     **kwargs)
+
+    @contextlib.contextmanager
+    def assert_max_redis_calls(self, n):
+        """
+        A context manager that fails if more than *n* redis commands
+        are issued in its body, as by requests made with ``self.testapp``::
+
+            with self.assert_max_redis_calls(10):
+                self.testapp.get('/dataserver2')
+
+        Each pipeline counts as one command.
+        """
+        registrations = getattr(self, '_redis_registrations', None)
+        counting = isinstance(self.ds.redis, CountingRedisClient)
+        client = count_redis_calls(self.ds, registrations)
+        before = client.calls.copy()
+        try:
+            yield client
+        finally:
+            if not counting:
+                stop_counting_redis_calls(self.ds, registrations)
+        calls = client.calls - before
+        assert_that(sum(calls.values()),
+                    described_as("At most %0 redis commands; issued %1",
+                                 less_than_or_equal_to(n),
+                                 n, dict(calls)))
+
+    #: A list of dictionaries, one for each :meth:`latency_budget`
+    #: used by the test, holding the budget and the measured samples.
+    latency_samples = ()
+
+    @contextlib.contextmanager
+    def latency_budget(self, ms, percentile=95, repeat=20, warmup=2,
+                       testapp=None):
+        """
+        A context manager that fails if the requests made in its body
+        take more than *ms* milliseconds at the given *percentile*::
+
+            with self.latency_budget(ms=50, percentile=95, repeat=20):
+                self.fetch_service_doc()
+
+        The body itself runs once, as usual; the requests it makes with
+        *testapp* (``self.testapp`` by default) are recorded. Afterwards,
+        they are all made again *warmup* times, unmeasured, and then
+        *repeat* times, timing each repetition of the whole sequence. Each
+        request must get the same status it got the first time, so the
+        requests should be safe to repeat, as GETs are.
+
+        Each sample is thus the time taken by *all* the requests of the
+        body, in order, not by any single one of them; a body making
+        several requests should have a budget for all of them together.
+
+        The samples are added to :attr:`latency_samples`.
+        """
+        if testapp is None:
+            testapp = self.testapp
+        recorded = []
+        # Someone else may be wrapping do_request on the instance
+        # (as the benchmark does); put that back afterwards.
+        previous = testapp.__dict__.get('do_request', _MISSING)
+        do_request = testapp.do_request
+
+        def record(req, *args, **kwargs):
+            copy = req.copy()
+            res = do_request(req, *args, **kwargs)
+            recorded.append((copy, res.status_int))
+            return res
+        testapp.do_request = record
+        try:
+            yield
+        finally:
+            if previous is _MISSING:
+                del testapp.do_request
+            else:
+                testapp.do_request = previous
+
+        samples = []
+        for i in range(warmup + repeat):
+            start = time.time()
+            for req, status in recorded:
+                do_request(req.copy(), status=status)
+            if i >= warmup:
+                samples.append((time.time() - start) * 1000.0)
+
+        measured = nearest_rank(samples, percentile)
+        if not self.latency_samples:
+            self.latency_samples = []
+        self.latency_samples.append({
+            'ms': ms,
+            'percentile': percentile,
+            'measured': measured,
+            'requests': [req.path_qs for req, _ in recorded],
+            'samples': samples,
+        })
+        assert_that(measured,
+                    described_as("The %0th percentile latency (ms) at most %1",
+                                 less_than_or_equal_to(ms),
+                                 percentile, ms))
 AppTestBaseMixin = _AppTestBaseMixin
 
 
+_MISSING = object()
+
+
+def _app_configuration_key(cls, settings):
+    """
+    A hashable value that is equal for two classes that would
+    create identically configured applications.
+    """
+    return (tuple(sorted(cls.features or ())),
+            bool(cls.APP_IN_DEVMODE),
+            tuple(sorted((str(k), repr(v)) for k, v in settings.items())))
+
+
 def _create_app(cls, *unused_args, **unused_kwargs):
     setHooks()
 
@@ -220,7 +435,8 @@ def _create_app(cls, *unused_args, **unused_kwargs):
     import zope.browserpage.metaconfigure
     zope.browserpage.metaconfigure.clear()
 
-    gc.collect()
+    with timed_phase(cls, 'gc.collect'):
+        gc.collect()
     # During initial application setup, we need to have an open
     # database/dataserver in case any global setup needs to be
     # done. Whatever changes it makes we need to capture and use
@@ -232,11 +448,26 @@ def _create_app(cls, *unused_args, **unused_kwargs):
     # but still, configuration must be done)
     _ds = []
 
+    # If we have a snapshot of the storage produced by an identical
+    # configuration, use it as the base. The generations
+    # will find themselves already installed and do nothing.
+    settings = cls._extra_app_settings()
+    fingerprint = snapshot = None
+    if snapshot_directory():
+        fingerprint = snapshot_fingerprint(cls.features,
+                                           cls.APP_IN_DEVMODE,
+                                           settings)
+        with timed_phase(cls, 'loadSnapshot'):
+            snapshot = load_storage_snapshot(fingerprint)
+
+    from nti.dataserver.tests import mock_dataserver
+
     def create_ds():
-        _ds.append(mock_dataserver.MockDataserver(base_storage=None))
+        _ds.append(mock_dataserver.MockDataserver(base_storage=snapshot))
         return _ds[0]
 
-    library = cls._setup_library()
+    with timed_phase(cls, '_setup_library'):
+        library = cls._setup_library()
     if library is not None:
         try:
             from nti.contentlibrary.interfaces import IContentPackageLibrary
@@ -244,21 +475,34 @@ def _create_app(cls, *unused_args, **unused_kwargs):
                                                        provided=IContentPackageLibrary)
         except ImportError:
             pass
-    app, conf_context = createApplication(8080,
-                                          create_ds=create_ds,
-                                          pyramid_config=cls.config,
-                                          devmode=cls.APP_IN_DEVMODE,
-                                          testmode=True,
-                                          zcml_features=cls.features,
-                                          secure_cookies=False,  # so we can authenticate with webtest cookies
-                                          _return_xml_conf_machine=True,
-                                          **cls._extra_app_settings())
+    with timed_phase(cls, 'createApplication'), \
+            cached_actions(_app_configuration_key(cls, settings),
+                           getattr(cls, 'CACHE_ZCML', False)):
+        app, conf_context = _createApplication(8080,
+                                               create_ds=create_ds,
+                                               pyramid_config=cls.config,
+                                               devmode=cls.APP_IN_DEVMODE,
+                                               testmode=True,
+                                               zcml_features=cls.features,
+                                               secure_cookies=False,  # so we can authenticate with webtest cookies
+                                               _return_xml_conf_machine=True,
+                                               **settings)
     cls.app = app
     # Unconditionally replace the configuration_context with the one we just loaded.
     # Most of the time, when we create the app, we won't have loaded any packages
     # anyway. The features will be the same. This way we keep the _seen_files.
     cls.configuration_context = conf_context
     cls._storage_base = _ds[0].db.storage
+    # Keep anything written to redis while creating the app, since
+    # isolated tests will otherwise never see it.
+    cls._redis_base = None
+    if redis_isolation_enabled():
+        cls._redis_base = redis_snapshot(_ds[0].redis)
+    # How tests' clients are registered, so replacing them is cheap
+    cls._redis_registrations = redis_registrations(_ds[0].redis)
+    if fingerprint is not None and snapshot is None:
+        with timed_phase(cls, 'saveSnapshot'):
+            save_storage_snapshot(cls._storage_base, fingerprint)
     _ds[0].close()  # closing closes the storage and deletes the attribute
     cls.current_mock_ds = _ds[0]
 
@@ -279,11 +523,13 @@ def _test_set_up(self):
 
     self.users = {}
     self.testapp = None
+    self._service_docs = None
 
 
 def _test_tear_down(self):
     self.users = {}
     self.testapp = None
+    self._service_docs = None
 
 
 class SharedApplicationTestBase(_AppTestBaseMixin, SharedConfiguringTestBase):
@@ -297,7 +543,7 @@ class SharedApplicationTestBase(_AppTestBaseMixin, SharedConfiguringTestBase):
 
     @classmethod
     def _setup_library(cls, *unused_args, **unused_kwargs):
-        return Library()
+        return _create_library()
 
     @classmethod
     def _extra_app_settings(cls):
@@ -323,8 +569,6 @@ class SharedApplicationTestBase(_AppTestBaseMixin, SharedConfiguringTestBase):
         super(SharedApplicationTestBase, cls).tearDownClass()
 
 
-from nti.dataserver.tests.mock_dataserver import DSInjectorMixin
-
 from nti.testing.layers import find_test
 from nti.testing.layers import GCLayerMixin
 from nti.testing.layers import ZopeComponentLayer
@@ -332,26 +576,114 @@ from nti.testing.layers import ConfiguringLayerMixin
 
 import zope.testing.cleanup
 
+from nti.app.testing.layers import DSInjectorMixin
 from nti.app.testing.layers import PyramidLayerMixin
+from nti.app.testing.layers import defer_tear_down
+from nti.app.testing.layers import take_deferred_layer
+from nti.app.testing.layers import finish_deferred_tear_down
+
+#: The name of an environment variable. If it is set to a non-empty
+#: value, application layers reuse the application of the previous
+#: layer when it was configured identically.
+REUSE_APP_ENV = 'NTI_APP_TESTING_REUSE_APP'
+
+#: The name of an environment variable. If it is set to a non-empty
+#: value, the objects created when setting up an application layer are
+#: moved out of the garbage collector's view until it is torn down.
+FREEZE_GC_ENV = 'NTI_APP_TESTING_FREEZE_GC'
 
 
 class AppCreatingLayerHelper(object):
 
+    #: If true, tearing down a layer is put off until the next
+    #: layer is set up. If that layer would create an identically configured
+    #: application, it takes over the existing application, base storage
+    #: and pyramid configuration instead of creating them again.
+    #: Only one application can be registered at a time, so any difference
+    #: in configuration (such as a devmode layer followed by a
+    #: non-devmode one) means creating the application again; run
+    #: identically configured layers together (see
+    #: :mod:`nti.app.testing.scheduling`) to get the most from this.
+    #: Defaults to the value of the environment variable named by
+    #: :data:`REUSE_APP_ENV`.
+    REUSE_APP = bool(os.environ.get(REUSE_APP_ENV))
+
+    #: If true, and supported by this Python (3.7 and above), once
+    #: the application has been created all objects are frozen with
+    #: :func:`gc.freeze`, so the collections done for each test only
+    #: scan objects created since. They are unfrozen when the layer is
+    #: torn down. This also keeps forked processes from touching (and
+    #: so copying) the pages of those objects. Defaults to the value of the
+    #: environment variable named by :data:`FREEZE_GC_ENV`.
+    FREEZE_GC = bool(os.environ.get(FREEZE_GC_ENV))
+
+    #: If true, the ZCML configuration actions of the application are
+    #: recorded the first time a layer with this configuration is set up,
+    #: and replayed by later ones (see :mod:`nti.app.testing.zcml`).
+    #: Defaults to the value of the environment variable named by
+    #: :data:`nti.app.testing.zcml.ACTION_CACHE_ENV`.
+    CACHE_ZCML = action_cache_enabled()
+
+    #: The class attributes of a layer that make up its state
+    #: once set up.
+    _LAYER_STATE = ('app', 'config', 'configuration_context',
+                    'current_mock_ds', 'security_policy',
+                    '_storage_base', '_redis_base', '_redis_registrations',
+                    '_mailer', '_pwman', '_gc_frozen')
+
     @classmethod
     def _setup_library(cls, *unused_args, **unused_kwargs):
-        return Library()
+        return _create_library()
 
     @classmethod
     def _extra_app_settings(cls):
         return {}
 
     @classmethod
-    def appSetUp(cls, layer):
+    def _reuse_key(cls, layer):
+        return (_app_configuration_key(layer, layer._extra_app_settings()),
+                tuple(layer.set_up_packages or ()),
+                bool(layer.set_up_mailer),
+                getattr(layer._setup_library, '__func__', layer._setup_library))
+
+    @classmethod
+    def appTakeOver(cls, layer):
+        """
+        If :attr:`REUSE_APP` is set and the tear down of an identically
+        configured layer was deferred, move its state to *layer* and
+        return True. Otherwise, finish any deferred tear down and
+        return False; *layer* must be set up from scratch.
+        """
+        previous = None
+        if cls.REUSE_APP:
+            previous = take_deferred_layer(cls._reuse_key(layer))
+        if previous is None:
+            finish_deferred_tear_down()
+            return False
+        for name in cls._LAYER_STATE:
+            setattr(layer, name, getattr(previous, name, None))
+            if name in previous.__dict__:
+                setattr(previous, name, None)
+        return True
+
+    @classmethod
+    def appSetUp(cls, layer, clean_up=False):
+        """
+        Set up *layer*, taking over the state of an identically
+        configured layer if :meth:`appTakeOver` can. Otherwise, if
+        *clean_up* is true, :func:`zope.testing.cleanup.cleanUp` is
+        called first, so the layer starts fresh.
+        """
+        if cls.appTakeOver(layer):
+            return
+        if clean_up:
+            zope.testing.cleanup.cleanUp()
         clearSite()
         assert component.getSiteManager() is component.getGlobalSiteManager()
         setHooks()  # because a previous teardown might have killed them
         layer.setUpPyramid()
-        layer.setUpPackages()
+        with timed_phase(layer, 'setUpPackages'):
+            layer.setUpPackages()
         try:
             _create_app(layer)
         except Exception:
@@ -360,19 +692,48 @@ class AppCreatingLayerHelper(object):
             # done lots of work (potentially), so roll us back.
             print("WARNING: Tearing down layer",
                   layer, "because of failed setup")
-            cls.appTearDown(layer)
+            cls._appTearDown(layer)
             raise
+        if cls.FREEZE_GC and hasattr(gc, 'freeze'):
+            cls._freeze(layer)
+
+    @classmethod
+    def _freeze(cls, layer):
+        # Don't freeze garbage. This is also our baseline.
+        with timed_phase(layer, 'gc.collect (before freeze)'):
+            gc.collect()
+        gc.freeze()
+        layer._gc_frozen = True
+        with timed_phase(layer, 'gc.collect (frozen)'):
+            gc.collect()
+        before, after = phase_timings()[-2:]
+        logger.info("Froze %d objects for %s; collection went from %.3fs to %.3fs",
+                    gc.get_freeze_count(), layer, before.wall, after.wall)
 
     @classmethod
     def appTearDown(cls, layer):
+        if cls.REUSE_APP:
+            defer_tear_down(layer, cls._reuse_key(layer),
+                            lambda: cls._appTearDown(layer))
+        else:
+            cls._appTearDown(layer)
+
+    @classmethod
+    def _appTearDown(cls, layer):
         # This resets the GSM...
-        layer.tearDownPackages()
+        if getattr(layer, '_gc_frozen', False):
+            gc.unfreeze()
+            layer._gc_frozen = False
+        with timed_phase(layer, 'tearDownPackages'):
+            layer.tearDownPackages()
         layer.tearDownPyramid()
         clearSite()
         # ... and this resets the sub-sites; see
         # nti.appserver.policies.sites._reinit
-        zope.testing.cleanup.cleanUp()
-        gc.collect()
+        with timed_phase(layer, 'cleanUp'):
+            zope.testing.cleanup.cleanUp()
+        with timed_phase(layer, 'gc.collect'):
+            gc.collect()
         setHooks()
         layer.configuration_context = None
 
@@ -383,6 +744,8 @@ class AppCreatingLayerHelper(object):
         layer.setUpTestDS(test)
         layer.testSetUpPyramid(test)
         test._storage_base = layer._storage_base
+        test._redis_base = getattr(layer, '_redis_base', None)
+        test._redis_registrations = getattr(layer, '_redis_registrations', None)
         test.app = layer.app
         _test_set_up(test)
 
@@ -408,7 +771,7 @@ class ApplicationTestLayer(ZopeComponentLayer,
 
     @classmethod
     def _setup_library(cls, *unused_args, **unused_kwargs):
-        return Library()
+        return _create_library()
 
     @classmethod
     def _extra_app_settings(cls):
@@ -416,8 +779,8 @@ class ApplicationTestLayer(ZopeComponentLayer,
 
     @classmethod
     def setUp(cls):
-        zope.testing.cleanup.cleanUp()  # Make sure we're starting fresh.
-        AppCreatingLayerHelper.appSetUp(cls)
+        # Make sure we're starting fresh.
+        AppCreatingLayerHelper.appSetUp(cls, clean_up=True)
 
     @classmethod
     def tearDown(cls):
@@ -472,7 +835,7 @@ class NonDevmodeApplicationTestLayer(ZopeComponentLayer,
 
     @classmethod
     def _setup_library(cls, *unused_args, **unused_kwargs):
-        return Library()
+        return _create_library()
 
     @classmethod
     def _extra_app_settings(cls):
@@ -480,8 +843,7 @@ class NonDevmodeApplicationTestLayer(ZopeComponentLayer,
 
     @classmethod
     def setUp(cls):
-        zope.testing.cleanup.cleanUp()
-        AppCreatingLayerHelper.appSetUp(cls)
+        AppCreatingLayerHelper.appSetUp(cls, clean_up=True)
 
     @classmethod
     def tearDown(cls):
@@ -513,21 +875,22 @@ class ApplicationTestBase(_AppTestBaseMixin, ConfiguringTestBase):
     APP_IN_DEVMODE = True
 
     def _setup_library(self, *unused_args, **unused_kwargs):
-        return Library()
+        return _create_library()
 
     def setUp(self):
+        from nti.dataserver.tests import mock_dataserver
         super(ApplicationTestBase, self).setUp(pyramid_request=False)
         #self.ds = mock_dataserver.MockDataserver()
         test_func = getattr(self, self._testMethodName)
         ds_factory = getattr(test_func, 'mock_ds_factory',
                              mock_dataserver.MockDataserver)
 
-        self.app = createApplication(8080,
-                                     self._setup_library(),
-                                     create_ds=ds_factory,
-                                     pyramid_config=self.config,
-                                     devmode=self.APP_IN_DEVMODE,
-                                     testmode=True)
+        self.app = _createApplication(8080,
+                                      self._setup_library(),
+                                      create_ds=ds_factory,
+                                      pyramid_config=self.config,
+                                      devmode=self.APP_IN_DEVMODE,
+                                      testmode=True)
         self.ds = component.getUtility(IDataserver)
 
         # If we try to externalize things outside of an active request, but
@@ -18,6 +18,14 @@ patch_pyramid_on_import.patch()
 
 __test__ = False
 
+import os
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # pragma: no cover
+    # Python 2
+    from collections import Mapping
+
 from hamcrest import is_
 from hamcrest import none
 from hamcrest import is_not
@@ -38,8 +46,6 @@ from pyramid.interfaces import IAuthenticationPolicy
 from pyramid.testing import setUp as psetUp
 from pyramid.testing import tearDown as ptearDown
 
-from nti.app.pyramid_zope import z3c_zpt
-
 from nti.app.testing.request_response import DummyRequest
 
 from nti.app.testing.matchers import has_permission
@@ -48,8 +54,6 @@ from nti.app.testing.matchers import doesnt_have_permission
 from nti.app.testing.testing import TestMailDelivery
 from nti.app.testing.testing import ITestMailDelivery
 
-from nti.dataserver.tests import mock_dataserver
-
 from nti.dataserver.users.communities import Community
 
 from nti.dataserver.authorization import ROLE_ADMIN
@@ -68,9 +72,107 @@ zope.deferredimport.deprecatedFrom(
     "nti.app.testing.application_webtest",
     "SharedApplicationTestBase")
 
+#: The name of an environment variable. If it is set to a non-empty
+#: value, the template renderers are not set up until a template
+#: is first rendered.
+LAZY_RENDERERS_ENV = 'NTI_APP_TESTING_LAZY_RENDERERS'
+
 logger = __import__('logging').getLogger(__name__)
 
 
+def _current_mock_ds():
+    # The mock dataserver brings in the whole dataserver;
+    # only tests that use one need it.
+    from nti.dataserver.tests import mock_dataserver
+    return mock_dataserver.current_mock_ds
+
+
+def _include_template_renderers(config):
+    # Must provide the correct zpt template renderer or the email process blows up
+    # See application.py
+    config.include('pyramid_chameleon')
+    config.include('pyramid_mako')
+    # In the registry the others are in (and are looked up in), which is
+    # usually the GSM
+    from nti.app.pyramid_zope import z3c_zpt
+    config.registry.registerUtility(z3c_zpt.renderer_factory,
+                                    IRendererFactory,
+                                    name=".pt")
+
+
+#: The attribute of a registry set once :func:`_include_template_renderers`
+#: was called for it by a :class:`_LazyRendererFactory`
+_RENDERERS_INCLUDED = '_nti_app_testing_renderers_included'
+
+
+class _LazyRendererFactory(object):
+    """
+    Registered in place of the template renderer factories. The first time
+    any of them is used, the real factories are set up in the registry
+    of the configuration, replacing all of these, and looked up there.
+    """
+
+    #: The renderers registered by the packages
+    #: :func:`_include_template_renderers` includes.
+    names = ('.pt', '.txt', '.mak', '.mako')
+
+    def __init__(self, config, name):
+        self.config = config
+        self.name = name
+
+    def __call__(self, info):
+        registry = self.config.registry
+        if not getattr(registry, _RENDERERS_INCLUDED, False):
+            setattr(registry, _RENDERERS_INCLUDED, True)
+            _include_template_renderers(self.config)
+        factory = registry.queryUtility(IRendererFactory, name=self.name)
+        if factory is None or isinstance(factory, _LazyRendererFactory):
+            raise LookupError("No renderer factory for %s" % self.name)
+        return factory(info)
+
+
+def _setup_template_renderers(config, lazy=False):
+    """
+    Set up the template renderers the application (and mail) needs.
+
+    If *lazy* is true, this only registers placeholders; the
+    (relatively expensive) inclusion of ``pyramid_chameleon`` and
+    ``pyramid_mako`` happens the first time a template renderer is
+    looked up, if ever, and only once for each registry. Configuration
+    directives those packages add, such as ``add_mako_renderer``, are
+    not available until then.
+    """
+    if not lazy:
+        _include_template_renderers(config)
+        return
+    # The registry may have been cleaned up and be set up again
+    setattr(config.registry, _RENDERERS_INCLUDED, False)
+    for name in _LazyRendererFactory.names:
+        config.registry.registerUtility(_LazyRendererFactory(config, name),
+                                        IRendererFactory,
+                                        name=name)
+
+
+def _link_index(ext_obj):
+    """
+    Return a new dictionary from each rel to the first link with that
+    rel in the ``Links`` of the externalized object *ext_obj*.
+
+    Nothing is cached: externalized objects are plain mappings that
+    tests may change, so an index is only good for the lookups of the
+    call that built it.
+    """
+    index = {}
+    for lnk in ext_obj.get('Links') or ():
+        index.setdefault(lnk['rel'], lnk)
+    return index
+
+
+def _ext_objs(items):
+    # A single externalized object, or a sequence of them
+    return (items,) if isinstance(items, Mapping) else items
+
+
 def _create_request(self, request_factory, request_args):
     self.request = request_factory(*request_args)
     if request_factory is DummyRequest:
@@ -86,6 +188,11 @@ class _TestBaseMixin(object):
 
     set_up_packages = ('nti.appserver',)
     set_up_mailer = True
+    #: If true, setting up the mailer only sets up the
+    #: template renderers when a template is first rendered.
+    #: Defaults to the value of the environment variable named by
+    #: :data:`LAZY_RENDERERS_ENV`.
+    lazy_template_renderers = bool(os.environ.get(LAZY_RENDERERS_ENV))
     config = None
     request = None
     _ds = None
@@ -99,7 +206,7 @@ class _TestBaseMixin(object):
         """
         Convenience for when you have imported mock_dataserver and used @WithMockDS/Trans
         """
-        return self._ds or mock_dataserver.current_mock_ds
+        return self._ds or _current_mock_ds()
 
     def set_ds(self, ds):
         """
@@ -116,32 +223,78 @@ class _TestBaseMixin(object):
     default_community = None
 
     def _create_user(self, username=None, password=u'temp001', **kwargs):
-        if username is None:
-            # BWC with the old name if it is being set at the class level
-            username = getattr(self, 'extra_environ_default_user',
-                               self.default_username).lower()
-            ifaces = self.default_user_extra_interfaces
-        else:
-            ifaces = kwargs.pop('extra_interfaces', ())
-
-        user = User.create_user(self.ds, username=username,
-							    password=password, **kwargs)
-        interface.alsoProvides(user, ifaces)
-
-        if self.default_community:
-            comm = Community.get_community(self.default_community, self.ds)
-            if not comm:
-                comm = Community.create_community(self.ds,
-												  username=self.default_community)
-            user.record_dynamic_membership(comm)
-
-        # BWC as all nextthought.com users were previously admins
-        # TODO: Require tests to specify they want an admin user, rather
-        #  than the implicit grant below
-        if username.lower().endswith("nextthought.com"):
-            self._assign_role(ROLE_ADMIN, username)
-
-        return user
+        return self._create_users((username,), password, **kwargs)[0]
+
+    def _create_users(self, usernames, password=u'temp001', **kwargs):
+        """
+        Create a user for each of *usernames*, as :meth:`_create_user`
+        does, and return them in a list in the same order.
+
+        The default community is looked up (or created) only once,
+        after the first user, and so is the role manager the admin role
+        is granted with, rather than once for each user. Everything else
+        is done for each user exactly as :meth:`_create_user` does; if
+        :meth:`_assign_role` is overridden, it is still called for each
+        admin. Like :meth:`_create_user`, this must be called in a
+        transaction; all the users are created in that transaction.
+        """
+        # Unless a subclass has its own way of granting roles, grant
+        # them all with the same role manager
+        assign_role = None
+        if type(self)._assign_role.__code__ is not _TestBaseMixin._assign_role.__code__:
+            assign_role = self._assign_role
+        community = None
+        role_manager = None
+        result = []
+        for username in usernames:
+            create_kwargs = kwargs
+            if username is None:
+                # BWC with the old name if it is being set at the class level
+                username = getattr(self, 'extra_environ_default_user',
+                                   self.default_username).lower()
+                ifaces = self.default_user_extra_interfaces
+            else:
+                create_kwargs = dict(kwargs)
+                ifaces = create_kwargs.pop('extra_interfaces', ())
+
+            user = User.create_user(self.ds, username=username,
+                                    password=password, **create_kwargs)
+            interface.alsoProvides(user, ifaces)
+
+            if self.default_community:
+                if community is None:
+                    community = self._default_community()
+                user.record_dynamic_membership(community)
+
+            # BWC as all nextthought.com users were previously admins
+            # TODO: Require tests to specify they want an admin user, rather
+            #  than the implicit grant below
+            if username.lower().endswith("nextthought.com"):
+                if assign_role is not None:
+                    assign_role(ROLE_ADMIN, username)
+                else:
+                    if role_manager is None:
+                        role_manager = self._role_manager()
+                    role_manager.assignRoleToPrincipal(getattr(ROLE_ADMIN, 'id', ROLE_ADMIN),
+                                                       username)
+
+            result.append(user)
+        return result
+
+    def _default_community(self):
+        """
+        Return the :attr:`default_community`, creating it if needed.
+        """
+        comm = Community.get_community(self.default_community, self.ds)
+        if not comm:
+            comm = Community.create_community(self.ds,
+                                              username=self.default_community)
+        return comm
+
+    @staticmethod
+    def _role_manager():
+        ds_folder = component.getUtility(IDataserver).dataserver_folder
+        return IPrincipalRoleManager(ds_folder)
 
     def _assign_role(self, role, username=None):
         if username is None:
@@ -149,9 +302,7 @@ class _TestBaseMixin(object):
 
         role = getattr(role, 'id', role)
 
-        ds_folder = component.getUtility(IDataserver).dataserver_folder
-        ds_role_manager = IPrincipalRoleManager(ds_folder)
-        ds_role_manager.assignRoleToPrincipal(role, username)
+        self._role_manager().assignRoleToPrincipal(role, username)
 
     def _get_user(self, username=None):
         if username is None:
@@ -191,6 +342,33 @@ class _TestBaseMixin(object):
         __traceback_info__ = ext_obj, link, rel
         assert_that(link, is_(none()), rel)
 
+    def links_by_rel(self, items):
+        """
+        Return, for the externalized object *items*, or for each in the
+        sequence *items* (such as the ``Items`` of a collection), a
+        dictionary from rel to link.
+        """
+        result = [_link_index(ext_obj) for ext_obj in _ext_objs(items)]
+        return result[0] if isinstance(items, Mapping) else result
+
+    def require_links(self, items, rels):
+        """
+        Check that the externalized object *items*, or each in the
+        sequence *items*, has a link with each of *rels*, and return
+        dictionaries from those rels to the hrefs, like :meth:`links_by_rel`.
+        """
+        result = []
+        missing = []
+        for i, ext_obj in enumerate(_ext_objs(items)):
+            index = _link_index(ext_obj)
+            missing.extend((i, rel) for rel in rels if rel not in index)
+            result.append(dict((rel, index[rel]['href'])
+                               for rel in rels if rel in index))
+        __traceback_info__ = items, rels
+        assert_that(missing,
+                    described_as("Links with rels %0", is_([]), rels))
+        return result[0] if isinstance(items, Mapping) else result
+
     @staticmethod
     def __cleanup_security_policy(unregister, restore):
         gsm = component.getGlobalSiteManager()
@@ -287,14 +465,8 @@ class ConfiguringTestBase(_TestBaseMixin, _ConfiguringTestBase, _PWManagerMixin)
             self.request.registry = component.getGlobalSiteManager()
 
         if self.set_up_mailer:
-            # Must provide the correct zpt template renderer or the email process blows up
-            # See application.py
-            self.config.include('pyramid_chameleon')
-            self.config.include('pyramid_mako')
-            # XXX: We should probably be using the GSM, yes?
-            component.provideUtility(z3c_zpt.renderer_factory,
-                                     IRendererFactory,
-                                     name=".pt")
+            _setup_template_renderers(self.config,
+                                      self.lazy_template_renderers)
             mailer = TestMailDelivery()
             component.provideUtility(mailer, ITestMailDelivery)
 
@@ -347,12 +519,8 @@ class SharedConfiguringTestBase(_TestBaseMixin, _SharedConfiguringTestBase):
         cls.config.setup_registry()
 
         if cls.set_up_mailer:
-            # Must provide the correct zpt template renderer or the email process blows up
-            # See application.py
-            cls.config.include('pyramid_chameleon')
-            cls.config.include('pyramid_mako')
-            component.provideUtility(z3c_zpt.renderer_factory,
-									 IRendererFactory, name=".pt")
+            _setup_template_renderers(cls.config,
+                                      cls.lazy_template_renderers)
             cls._mailer = mailer = TestMailDelivery()
             component.provideUtility(mailer, ITestMailDelivery)
 
@@ -363,7 +531,7 @@ class SharedConfiguringTestBase(_TestBaseMixin, _SharedConfiguringTestBase):
                     component.provideUtility(cls.security_policy, iface)
         return cls.config
 
-    ds = property(lambda unused: getattr(mock_dataserver, 'current_mock_ds'))
+    ds = property(lambda unused: _current_mock_ds())
 
     @classmethod
     def tearDownClass(cls):
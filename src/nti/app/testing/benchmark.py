@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A throughput benchmark of the application, run on an application
+test layer instead of a real server, database and redis.
+
+The ``nti_app_benchmark`` console script sets up the layer (by default
+:class:`nti.app.testing.application_webtest.ApplicationTestLayer`),
+seeds a dataset of users and drives one or more named workloads through
+:func:`nti.app.testing.webtest.TestApp` for a number of requests or
+a number of seconds. It prints a JSON report of the requests per
+second, latency percentiles, ZODB loads per request and growth of the
+resident set size::
+
+    nti_app_benchmark --users 1000 --requests 5000 service_doc resolve_user
+
+A workload is a callable taking the test (an
+:class:`nti.app.testing.application_webtest.ApplicationLayerTest`,
+whose ``testapp`` is authenticated as the default user) and making
+some requests; it is called repeatedly. The workloads in
+:data:`WORKLOADS` can be named directly, others by dotted name.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import sys
+import json
+import time
+import argparse
+
+from nti.app.testing.harness import resolve
+from nti.app.testing.harness import layer_test
+from nti.app.testing.harness import layer_set_up
+
+from nti.app.testing.replay import DEFAULT_LAYER
+from nti.app.testing.replay import Measurements
+
+from nti.app.testing.timing import current_rss
+
+__test__ = False
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def service_doc(test):
+    test.fetch_service_doc(cached=False)
+
+
+def resolve_user(test):
+    test.resolve_user()
+
+
+def search_users(test):
+    test.search_users(username=test.default_username[:3])
+
+
+def user_activity(test):
+    test.fetch_user_activity()
+
+
+#: The workloads that can be named directly.
+WORKLOADS = {
+    'service_doc': service_doc,
+    'resolve_user': resolve_user,
+    'search_users': search_users,
+    'user_activity': user_activity,
+}
+
+
+def workload(name):
+    try:
+        return WORKLOADS[name]
+    except KeyError:
+        return resolve(name)
+
+
+def seed_users(test, count, prefix='user'):
+    """
+    Create *count* users, in addition to the default user, in
+    one transaction.
+    """
+    from nti.dataserver.tests.mock_dataserver import mock_db_trans
+    names = [u'%s%06d' % (prefix, i) for i in range(count)]
+    with mock_db_trans(test.ds):
+        test._create_users(names)
+    return names
+
+
+def run(workloads, layer=DEFAULT_LAYER, users=0, community=None,
+        requests=None, duration=None):
+    """
+    Run the callables *workloads* in turn against *layer* until
+    *requests* requests have been made or *duration* seconds
+    have passed (by default, each workload runs once), and
+    return the report as a dictionary.
+    """
+    from nti.app.testing.decorators import WithSharedApplicationMockDS
+    from nti.app.testing.application_webtest import ApplicationLayerTest
+    from nti.app.testing.webtest import TestApp
+
+    if not hasattr(layer, 'setUp'):
+        layer = resolve(layer)
+    measurements = Measurements()
+    report = {}
+
+    class BenchmarkTest(ApplicationLayerTest):
+
+        default_community = community
+
+        @WithSharedApplicationMockDS(users=True, testapp=False)
+        def test_benchmark(self):
+            seed_users(self, users)
+            # Measure every request the workloads make
+            self.testapp = TestApp(self.app,
+                                   middleware=measurements.middleware,
+                                   zodb_stats=True,
+                                   extra_environ=self._make_extra_environ())
+
+            rss = current_rss()
+            start = time.time()
+            passes = 0
+            done = False
+            while not done:
+                before = measurements.requests
+                for func in workloads:
+                    func(self)
+                passes += 1
+                done = requests is None and duration is None
+                if requests is not None and measurements.requests >= requests:
+                    done = True
+                if duration is not None and time.time() - start >= duration:
+                    done = True
+                if not done and measurements.requests == before:
+                    raise ValueError("The workloads made no requests with "
+                                     "the testapp; nothing to measure")
+            report['passes'] = passes
+            report['wall_seconds'] = time.time() - start
+            if rss is not None:
+                report['rss_growth'] = current_rss() - rss
+    BenchmarkTest.layer = layer
+
+    with layer_set_up(layer) as layers:
+        test = BenchmarkTest('test_benchmark')
+        with layer_test(layers, test):
+            test.debug()
+
+    report.update(measurements.report())
+    report['users'] = users
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the application on a test layer")
+    parser.add_argument('workloads', nargs='*', default=['service_doc'],
+                        help="Names of workloads to run in turn: one of %s, "
+                        "or a dotted name" % ', '.join(sorted(WORKLOADS)))
+    parser.add_argument('--layer', default=DEFAULT_LAYER,
+                        help="Dotted name of the application layer to use")
+    parser.add_argument('--users', type=int, default=0,
+                        help="How many extra users to create first")
+    parser.add_argument('--community', default=None,
+                        help="A community the users belong to")
+    parser.add_argument('--requests', type=int, default=None,
+                        help="Stop after about this many requests")
+    parser.add_argument('--duration', type=float, default=None,
+                        help="Stop after this many seconds")
+    parser.add_argument('--output', default=None,
+                        help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run([workload(name) for name in args.workloads],
+                 layer=args.layer, users=args.users,
+                 community=args.community, requests=args.requests,
+                 duration=args.duration)
+    report['workloads'] = args.workloads
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Policies for when the pipeline built by
+:func:`nti.app.testing.webtest.TestApp` resets the ZODB caches after a
+request.
+
+Resetting the caches after every request (:class:`AlwaysReset`, the
+default) makes sure that each request loads what it uses from
+storage, catching objects that were changed but never saved. Tests that
+make many requests pay for that by reloading every object each time.
+The other policies reset less often.
+
+A policy can be given to ``TestApp``, or chosen for all of them with the
+environment variable named by :data:`CACHE_RESET_ENV`, using the
+strings understood by :func:`parse_cache_reset_policy`.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import os
+
+import six
+
+from nti.app.testing.timing import current_rss
+
+__test__ = False
+
+#: The name of an environment variable. If it is set, it is the
+#: default cache reset policy, as a string understood by
+#: :func:`parse_cache_reset_policy`.
+CACHE_RESET_ENV = 'NTI_APP_TESTING_CACHE_RESET'
+
+#: The name of an environment variable. If it is set to a non-empty
+#: value, :class:`CacheResetStats` count the objects loaded again because
+#: of each reset.
+CACHE_RESET_STATS_ENV = 'NTI_APP_TESTING_CACHE_RESET_STATS'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class AlwaysReset(object):
+    """
+    Reset after every request.
+    """
+
+    def should_reset(self, unused_db):
+        return True
+
+    def __repr__(self):
+        return 'always'
+
+
+class NeverReset(object):
+    """
+    Never reset.
+    """
+
+    def should_reset(self, unused_db):
+        return False
+
+    def __repr__(self):
+        return 'never'
+
+
+class EveryNRequests(object):
+    """
+    Reset after every *n* requests.
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self._count = 0
+
+    def should_reset(self, unused_db):
+        self._count += 1
+        if self._count >= self.n:
+            self._count = 0
+            return True
+        return False
+
+    def __repr__(self):
+        return 'every:%d' % self.n
+
+
+class CacheSizeThreshold(object):
+    """
+    Reset when the connections of the database have more than
+    *size* objects in their caches.
+    """
+
+    def __init__(self, size):
+        self.size = size
+
+    def should_reset(self, db):
+        return db is not None and db.cacheSize() > self.size
+
+    def __repr__(self):
+        return 'size:%d' % self.size
+
+
+class RSSThreshold(object):
+    """
+    Reset when the resident set size of the process is
+    more than *megabytes*.
+    """
+
+    def __init__(self, megabytes):
+        self.megabytes = megabytes
+
+    def should_reset(self, unused_db):
+        rss = current_rss()
+        return rss is None or rss > self.megabytes * 1024 * 1024
+
+    def __repr__(self):
+        return 'rss:%d' % self.megabytes
+
+
+_POLICIES = {
+    'always': AlwaysReset,
+    'never': NeverReset,
+    'every': EveryNRequests,
+    'size': CacheSizeThreshold,
+    'rss': RSSThreshold,
+}
+
+
+def parse_cache_reset_policy(spec=None):
+    """
+    Return the policy described by *spec*, one of ``always``,
+    ``never``, ``every:N`` (requests), ``size:N`` (objects) or
+    ``rss:N`` (megabytes). Policy objects are returned unchanged.
+
+    If *spec* is None, the environment variable named by
+    :data:`CACHE_RESET_ENV` is used, defaulting to ``always``.
+    """
+    if spec is None:
+        spec = os.environ.get(CACHE_RESET_ENV) or 'always'
+    if not isinstance(spec, six.string_types):
+        return spec
+    name, _, arg = spec.strip().lower().partition(':')
+    try:
+        factory = _POLICIES[name]
+    except KeyError:
+        raise ValueError("Unknown cache reset policy %r" % spec)
+    return factory(int(arg)) if arg else factory()
+
+
+def _active_oids(db):
+    """
+    The oids of the objects that are not ghosts in the caches of
+    the connections of *db*.
+    """
+    result = set()
+
+    def collect(conn):
+        result.update(oid for oid, _ in conn._cache.lru_items())
+    db._connectionMap(collect)
+    return result
+
+
+class CacheResetStats(object):
+    """
+    Records, for each request, whether the caches were reset after it
+    and, if :attr:`count_reloads` is true, how many of the objects that
+    the previous reset evicted it loaded again.
+    """
+
+    #: Defaults to the value of the environment variable named
+    #: by :data:`CACHE_RESET_STATS_ENV`. Counting the reloaded objects
+    #: costs about as much as the reset itself.
+    count_reloads = bool(os.environ.get(CACHE_RESET_STATS_ENV))
+
+    def __init__(self):
+        #: A list of ``{'reset': bool, 'reloaded': int or None}``,
+        #: one for each request.
+        self.requests = []
+        self._evicted = None
+
+    @property
+    def resets(self):
+        return sum(1 for r in self.requests if r['reset'])
+
+    @property
+    def reloaded(self):
+        return sum(r['reloaded'] or 0 for r in self.requests)
+
+    def before_reset(self, db):
+        if self.count_reloads and db is not None:
+            self._evicted = _active_oids(db)
+
+    def record(self, db, reset):
+        reloaded = None
+        if self._evicted is not None and db is not None:
+            reloaded = len(self._evicted & _active_oids(db))
+        self._evicted = None
+        result = {'reset': reset, 'reloaded': reloaded}
+        self.requests.append(result)
+        return result
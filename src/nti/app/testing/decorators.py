@@ -11,16 +11,98 @@ from __future__ import absolute_import
 # disable: accessing protected members, too many methods
 # pylint: disable=I0011,W0212,R0904
 
+import os
 import warnings
 import functools
 
+from nti.app.testing.redis_client import reset_redis
+from nti.app.testing.redis_client import redis_snapshot
+from nti.app.testing.redis_client import CountingRedisClient
+
+from nti.app.testing.storage import stack_changes
+
 from nti.app.testing.webtest import TestApp
 
+from nti.dataserver.interfaces import IDataserver
+
 from nti.dataserver.tests import mock_dataserver
 
+from nti.dataserver.users.users import User
+
+#: The name of an environment variable. If it is set to a non-empty
+#: value, :func:`WithSharedApplicationMockDS` defaults to creating
+#: the requested users once and reusing them between tests.
+USER_FIXTURES_ENV = 'NTI_APP_TESTING_USER_FIXTURES'
+
 logger = __import__('logging').getLogger(__name__)
 
 
+def _storage_cache(storage):
+    """
+    Return a dictionary for caching things built on top of *storage*.
+
+    It is kept on the storage itself: what we cache refers back to the
+    storage, so a weak mapping keyed by the storage would never let
+    it go.
+    """
+    try:
+        return storage._nti_app_testing_cache
+    except AttributeError:
+        cache = storage._nti_app_testing_cache = {}
+        return cache
+
+
+class _UserFixture(object):
+    """
+    The users created by the first test that asked for them: a storage
+    holding them on top of the layer's base storage, and the redis data
+    there was once they were created.
+    """
+
+    def __init__(self, storage, usernames, redis):
+        self.storage = storage
+        self.usernames = usernames
+        self.redis = redis
+
+
+def _user_fixture_key(test, users_to_create, user_hook, users_hook):
+    return (users_to_create if users_to_create is True else tuple(users_to_create),
+            getattr(test, 'extra_environ_default_user', None),
+            getattr(test, 'default_username', None),
+            getattr(test, 'default_community', None),
+            tuple(getattr(test, 'default_user_extra_interfaces', None) or ()),
+            type(test)._create_user,
+            user_hook,
+            users_hook)
+
+
+def _redis_registrations(test):
+    return getattr(test, '_redis_registrations', None)
+
+
+def _user_fixtures(test):
+    return _storage_cache(test._storage_base).setdefault('user_fixtures', {})
+
+
+def _save_user_fixture(test, key):
+    """
+    Save the users the dataserver of *test* has just created, and
+    everything else it has committed, as the :class:`_UserFixture`
+    for *key*.
+    """
+    storage = test.ds.db.storage
+    if getattr(storage, 'changes', None) is None:  # pragma: no cover
+        # Not a demo storage; nothing we can stack
+        return
+    client = test.ds.redis
+    if isinstance(client, CountingRedisClient):
+        client = client.client
+    _user_fixtures(test)[key] = _UserFixture(
+        stack_changes(storage, test._storage_base),
+        list(test.users),
+        redis_snapshot(client))
+
+
 def WithSharedApplicationMockDS(*args, **kwargs):
     """
     Decorator for a test function using the shared application.
@@ -38,6 +120,20 @@ def WithSharedApplicationMockDS(*args, **kwargs):
     :keyword function users_hook: If given, a function that will be called with
             a mapping {username:user} after we have created all users, in the scope
             of the transaction.
+    :keyword bool snapshot_users: If True, and the test has a ``_storage_base``,
+            then the users are created only once for each distinct combination
+            of ``users``, the hooks, ``_create_user`` and the class attributes
+            that affect it (such as ``default_community``). The first such
+            test creates them as usual; what its dataserver has committed by
+            then, and its redis data, are kept and given to the later tests
+            with the same combination, which only look the users up. The
+            hooks are therefore called only once, in the first test: anything
+            they do outside the database and redis (such as setting
+            attributes on the test) is not repeated for later tests.
+            Defaults to the value of the environment variable named by
+            :data:`USER_FIXTURES_ENV`.
+    :keyword bool trusted_auth: Passed to :func:`nti.app.testing.webtest.TestApp`
+            when creating ``self.testapp``. Pass False for tests of authentication.
     """
 
     users_to_create = kwargs.pop('users', None)
@@ -54,15 +150,19 @@ def WithSharedApplicationMockDS(*args, **kwargs):
         kwargs['with_changes'] = val
     user_hook = kwargs.pop('user_hook', None)
     users_hook = kwargs.pop('users_hook', None)
+    snapshot_users = kwargs.pop('snapshot_users',
+                                bool(os.environ.get(USER_FIXTURES_ENV)))
+    trusted_auth = kwargs.pop('trusted_auth', None)
 
     if testapp:
         def _make_app(self):
             if (   (users_to_create is True and default_authenticate is not False)
                 or (users_to_create and default_authenticate)):
-                self.testapp = TestApp(self.app, 
+                self.testapp = TestApp(self.app,
+                                       trusted_auth=trusted_auth,
                                        extra_environ=self._make_extra_environ())
             else:
-                self.testapp = TestApp(self.app)
+                self.testapp = TestApp(self.app, trusted_auth=trusted_auth)
 
     else:
         def _make_app(self):
@@ -84,6 +184,49 @@ def WithSharedApplicationMockDS(*args, **kwargs):
         def _do_create(self):
             pass
 
+    def _uses_fixture(self):
+        return (snapshot_users
+                and users_to_create
+                and getattr(self, '_storage_base', None) is not None)
+
+    def _fixture_key(self):
+        return _user_fixture_key(self, users_to_create, user_hook, users_hook)
+
+    def _fixture(self):
+        if not _uses_fixture(self):
+            return None
+        return _user_fixtures(self).get(_fixture_key(self))
+
+    def _base_storage(self):
+        # Are we in a layer that set up shared storage for us?
+        fixture = _fixture(self)
+        if fixture is not None:
+            return fixture.storage
+        return getattr(self, '_storage_base', None)
+
+    def _reset_redis(self):
+        fixture = _fixture(self)
+        if fixture is not None:
+            reset_redis(self.ds, fixture.redis, restore=True,
+                        registrations=_redis_registrations(self))
+        else:
+            reset_redis(self.ds, getattr(self, '_redis_base', None),
+                        registrations=_redis_registrations(self))
+
+    def _create_users(self):
+        fixture = _fixture(self)
+        if fixture is None:
+            _do_create(self)
+            if _uses_fixture(self):
+                _save_user_fixture(self, _fixture_key(self))
+            return
+        with mock_dataserver.mock_db_trans(self.ds):
+            self.users = {}
+            for username in fixture.usernames:
+                user = self.users[username] = User.get_user(username, self.ds)
+                # Loaded, like a user that was just created
+                user._p_activate()
+
     if len(args) == 1 and not kwargs:
         # being used as a decorator:
         # @WithSharedApplicatonMockDS
@@ -96,7 +239,8 @@ def WithSharedApplicationMockDS(*args, **kwargs):
         @mock_dataserver.WithMockDS(**kwargs)
         def f(self):
             self.config.registry._zodb_databases = {'': self.ds.db}  # 0.3
-            self.ds.redis.flushall()
+            reset_redis(self.ds, getattr(self, '_redis_base', None),
+                        registrations=_redis_registrations(self))
             _do_create(self)
             _make_app(self)
             func(self)
@@ -107,16 +251,15 @@ def WithSharedApplicationMockDS(*args, **kwargs):
     # @WithSharedApplicationMockDS(...)
     # def test_foo(...):
 
-    # Are we in a layer that set up shared storage for us?
-    kwargs['base_storage'] = lambda self: getattr(self, '_storage_base', None)
+    kwargs['base_storage'] = _base_storage
 
     def factory(func):
         @functools.wraps(func)
         @mock_dataserver.WithMockDS(**kwargs)
         def f(self):
             self.config.registry._zodb_databases = {'': self.ds.db}  # 0.3
-            self.ds.redis.flushall()
-            _do_create(self)
+            _reset_redis(self)
+            _create_users(self)
             _make_app(self)
             if getattr(self, 'setUpDs', None):
                 self.setUpDs(self.ds)
@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Running the tests of an expensive layer in forked worker processes.
+
+Setting up a layer like
+:class:`nti.app.testing.application_webtest.ApplicationTestLayer` is
+expensive, and the test runners either run all its tests serially or, if
+asked to run in parallel, set the layer up again in each subprocess.
+The :class:`ForkedLayerTests` object instead sets up the layer once,
+in the current process, and then forks worker processes that share the
+created application and its base storage copy-on-write. The workers
+ask the parent for tests one at a time, and send their results back to
+it; the parent reports them to the runner as usual.
+
+To use it, wrap the suite of a test module::
+
+    def test_suite():
+        suite = unittest.defaultTestLoader.loadTestsFromName(__name__)
+        return forked_layer_suite(suite)
+
+Because the returned objects set up the layers themselves and are
+not :class:`unittest.TestSuite` instances, test runners see each of them
+as a single test without a layer.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import os
+import time
+import select
+import unittest
+import collections
+import multiprocessing
+
+from nti.app.testing.harness import call_all
+from nti.app.testing.harness import layer_test
+from nti.app.testing.harness import layer_set_up
+
+__test__ = False
+
+#: The name of an environment variable giving the number of
+#: worker processes. If it is not set, one worker per CPU is used.
+#: Setting it to 1 runs the tests in-process.
+WORKERS_ENV = 'NTI_APP_TESTING_WORKERS'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def default_worker_count():
+    workers = os.environ.get(WORKERS_ENV)
+    if workers:
+        return int(workers)
+    return multiprocessing.cpu_count()
+
+
+class WorkerFailure(Exception):
+    """
+    Stands in for an exception raised by a test in a worker process.
+    The string value is the formatted traceback.
+    """
+
+    def __str__(self):
+        return self.args[0]
+
+
+class _RemoteSubTest(object):
+    """
+    Stands in for a subtest that ran in a worker process.
+    """
+
+    def __init__(self, test, subtest_id, description):
+        self.test_case = test
+        self.failureException = test.failureException
+        self._id = subtest_id
+        self._description = description
+
+    def id(self):
+        return self._id
+
+    def shortDescription(self):
+        return None
+
+    def __str__(self):
+        return self._description
+
+
+class _ConnectionResult(unittest.TestResult):
+    """
+    Used in the workers to send outcomes to the parent.
+    """
+
+    def __init__(self, index, conn):
+        super(_ConnectionResult, self).__init__()
+        self.index = index
+        self.conn = conn
+
+    def _send(self, kind, *args):
+        self.conn.send((kind, self.index) + args)
+
+    def addSuccess(self, test):
+        self._send('addSuccess')
+
+    def addError(self, test, err):
+        self._send('addError', self._exc_info_to_string(err, test))
+
+    def addFailure(self, test, err):
+        self._send('addFailure', self._exc_info_to_string(err, test))
+
+    def addSkip(self, test, reason):
+        self._send('addSkip', reason)
+
+    def addExpectedFailure(self, test, err):
+        self._send('addExpectedFailure', self._exc_info_to_string(err, test))
+
+    def addUnexpectedSuccess(self, test):
+        self._send('addUnexpectedSuccess')
+
+    def addSubTest(self, test, subtest, err):
+        if err is None:
+            outcome = message = None
+        else:
+            outcome = ('failure' if issubclass(err[0], test.failureException)
+                       else 'error')
+            message = self._exc_info_to_string(err, test)
+        self._send('addSubTest', subtest.id(), str(subtest), outcome, message)
+        if err is not None and self.failfast:  # pragma: no cover
+            self.stop()
+
+    def addDuration(self, test, elapsed):
+        self._send('addDuration', elapsed)
+
+
+def _worker(layers, tests, conn):
+    while True:
+        conn.send(('ready', None))
+        index = conn.recv()
+        if index is None:
+            break
+        conn.send(('startTest', index))
+        # The name matters: nti.testing.layers.find_test looks for it
+        test = tests[index]
+        start = time.time()
+        try:
+            call_all(layers, 'testSetUp')
+            test(_ConnectionResult(index, conn))
+            call_all(reversed(layers), 'testTearDown')
+        except Exception as e:  # pylint:disable=broad-except
+            conn.send(('addError', index, '%s: %s' % (type(e).__name__, e)))
+        conn.send(('stopTest', index, time.time() - start))
+    conn.close()
+
+
+class ForkedLayerTests(object):
+    """
+    Runs *tests*, all of which share *layer*, in worker processes
+    forked after *layer* has been set up.
+
+    After running, :attr:`timings` maps the id of each test to the
+    number of seconds it took in its worker.
+    """
+
+    def __init__(self, layer, tests, workers=None):
+        # Not called layer: we set it up ourself, so the runner
+        # must not know about it.
+        self._layer = layer
+        self.tests = list(tests)
+        self.workers = workers if workers is not None else default_worker_count()
+        self.timings = {}
+
+    def countTestCases(self):
+        return len(self.tests)
+
+    def id(self):
+        return '%s.%s (forked)' % (self._layer.__module__, self._layer.__name__)
+    __str__ = id
+
+    def shortDescription(self):
+        return None
+
+    def __call__(self, result):
+        return self.run(result)
+
+    def run(self, result):
+        with layer_set_up(self._layer) as layers:
+            if self.workers <= 1 or not hasattr(os, 'fork'):
+                self._run_serially(layers, result)
+            else:
+                self._run_forked(layers, result)
+        return result
+
+    def _run_serially(self, layers, result):
+        for test in self.tests:
+            if result.shouldStop:
+                break
+            start = time.time()
+            with layer_test(layers, test):
+                test(result)
+            self.timings[test.id()] = time.time() - start
+
+    def _run_forked(self, layers, result):
+        context = multiprocessing
+        if hasattr(multiprocessing, 'get_context'):
+            context = multiprocessing.get_context('fork')
+        pending = collections.deque(range(len(self.tests)))
+        running = {}  # conn -> index
+        processes = []
+
+        def spawn():
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_worker,
+                                      args=(layers, self.tests, child_conn))
+            process.start()
+            child_conn.close()
+            processes.append(process)
+            running[parent_conn] = None
+
+        for _ in range(min(self.workers, len(self.tests))):
+            spawn()
+
+        while running:
+            readable, _, _ = select.select(list(running), (), ())
+            for conn in readable:
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    # Exited, either normally or not.
+                    index = running.pop(conn)
+                    conn.close()
+                    self._lost(index, result)
+                    if index is not None and pending and not result.shouldStop:
+                        # It died running a test; replace it. (One that
+                        # dies between tests isn't, so workers that can't
+                        # start don't spawn forever.)
+                        spawn()
+                    continue
+                kind, index = message[:2]
+                if kind == 'ready':
+                    conn.send(pending.popleft() if pending and not result.shouldStop
+                              else None)
+                    continue
+                test = self.tests[index]
+                if kind == 'startTest':
+                    running[conn] = index
+                    result.startTest(test)
+                elif kind == 'stopTest':
+                    running[conn] = None
+                    self.timings[test.id()] = message[2]
+                    result.stopTest(test)
+                elif kind in ('addSuccess', 'addUnexpectedSuccess'):
+                    getattr(result, kind)(test)
+                elif kind == 'addSkip':
+                    result.addSkip(test, message[2])
+                elif kind == 'addSubTest':
+                    self._add_sub_test(test, result, *message[2:])
+                elif kind == 'addDuration':
+                    add_duration = getattr(result, 'addDuration', None)
+                    if add_duration is not None:
+                        add_duration(test, message[2])
+                else:
+                    failure = WorkerFailure(message[2])
+                    getattr(result, kind)(test, (WorkerFailure, failure, None))
+
+        for process in processes:
+            process.join()
+
+        # Left over if every worker died; they must still be reported
+        if not result.shouldStop:
+            for index in pending:
+                test = self.tests[index]
+                result.startTest(test)
+                failure = WorkerFailure('Not run: no worker process left')
+                result.addError(test, (WorkerFailure, failure, None))
+                result.stopTest(test)
+
+    def _add_sub_test(self, test, result, subtest_id, description,
+                      outcome, message):
+        subtest = _RemoteSubTest(test, subtest_id, description)
+        err = None
+        if outcome == 'failure':
+            err = (test.failureException, WorkerFailure(message), None)
+        elif outcome == 'error':
+            err = (WorkerFailure, WorkerFailure(message), None)
+        result.addSubTest(test, subtest, err)
+
+    def _lost(self, index, result):
+        if index is None:
+            return
+        test = self.tests[index]
+        failure = WorkerFailure('Worker process died running %s' % test)
+        result.addError(test, (WorkerFailure, failure, None))
+        result.stopTest(test)
+
+
+def _flatten(suite):
+    if isinstance(suite, unittest.TestSuite):
+        for test in suite:
+            for t in _flatten(test):
+                yield t
+    else:
+        yield suite
+
+
+def forked_layer_suite(suite, workers=None):
+    """
+    Return a suite that runs the tests found in *suite* grouped
+    by layer, each group in a :class:`ForkedLayerTests`. Tests
+    without a layer are run normally.
+    """
+    by_layer = {}
+    result = unittest.TestSuite()
+    for test in _flatten(suite):
+        layer = getattr(test, 'layer', None)
+        if layer is None:
+            result.addTest(test)
+        else:
+            by_layer.setdefault(layer, []).append(test)
+    for layer, tests in sorted(by_layer.items(), key=lambda i: i[0].__name__):
+        result.addTest(ForkedLayerTests(layer, tests, workers))
+    return result
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Helpers for running test layers and their tests outside of a test
+runner, as :mod:`nti.app.testing.forking`, :mod:`nti.app.testing.replay`
+and :mod:`nti.app.testing.benchmark` do, and for summarizing what
+they measure.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import math
+import importlib
+import contextlib
+
+__test__ = False
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def resolve(dotted_name):
+    """
+    Return the object named by *dotted_name*, a module
+    followed by the name of an attribute of it.
+    """
+    module, _, name = dotted_name.rpartition('.')
+    return getattr(importlib.import_module(module), name)
+
+
+def layer_chain(layer):
+    """
+    Return the layers that must be set up for *layer*, bases first,
+    in the order that :mod:`zope.testrunner` uses.
+    """
+    result = []
+
+    def visit(l):
+        for base in l.__bases__:
+            if base is not object:
+                visit(base)
+        if l not in result:
+            result.append(l)
+    visit(layer)
+    return result
+
+
+def call_all(layers, name):
+    """
+    Call the method *name* of each of *layers* that has one.
+    """
+    for layer in layers:
+        method = getattr(layer, name, None)
+        if method is not None:
+            method()
+
+
+@contextlib.contextmanager
+def layer_set_up(layer):
+    """
+    Set up *layer* and its bases for the body, which is given the
+    list of them, and tear down those that were set up afterwards.
+    """
+    layers = layer_chain(layer)
+    set_up = []
+    try:
+        for l in layers:
+            method = getattr(l, 'setUp', None)
+            if method is not None:
+                method()
+            set_up.append(l)
+        yield layers
+    finally:
+        call_all(reversed(set_up), 'tearDown')
+
+
+@contextlib.contextmanager
+def layer_test(layers, test):
+    """
+    Run the body as the test *test* of the set up *layers*.
+    """
+    # The argument's name matters: nti.testing.layers.find_test
+    # looks for it
+    call_all(layers, 'testSetUp')
+    try:
+        yield test
+    finally:
+        call_all(reversed(layers), 'testTearDown')
+
+
+def nearest_rank(samples, percentile):
+    """
+    The *percentile* of *samples*, by the nearest rank method,
+    or 0 if there are no samples.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = int(math.ceil(percentile / 100.0 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
@@ -18,7 +18,10 @@ patch_pyramid_on_import.patch()
 
 __test__ = False
 
-from pyramid.interfaces import IRendererFactory
+import os
+import atexit
+
+from pyramid.interfaces import ISettings
 from pyramid.interfaces import IAuthorizationPolicy
 from pyramid.interfaces import IAuthenticationPolicy
 
@@ -31,15 +34,15 @@ import zope.testing.cleanup
 
 from zope import component
 
-from nti.app.pyramid_zope import z3c_zpt
-
 from nti.app.testing.base import DummyRequest
+from nti.app.testing.base import LAZY_RENDERERS_ENV
 from nti.app.testing.base import _PWManagerMixin
+from nti.app.testing.base import _setup_template_renderers
 
 from nti.app.testing.testing import TestMailDelivery
 from nti.app.testing.testing import ITestMailDelivery
 
-from nti.dataserver.tests.mock_dataserver import DSInjectorMixin
+from nti.app.testing.timing import timed_phase
 
 from nti.testing.layers import find_test
 from nti.testing.layers import ZopeComponentLayer
@@ -48,6 +51,85 @@ from nti.testing.layers import ConfiguringLayerMixin
 logger = __import__('logging').getLogger(__name__)
 
 
+def _current_settings():
+    return component.getGlobalSiteManager().queryUtility(ISettings)
+
+
+class _DeferredTearDown(object):
+
+    def __init__(self, layer, key, tear_down):
+        self.layer = layer
+        self.key = key
+        self.tear_down = tear_down
+        # What the registry must still have for the layer to be reused
+        self.settings = _current_settings()
+
+#: The tear down of a layer that has been put off in the hope
+#: that the next layer set up can reuse its state.
+_deferred_tear_down = None
+
+
+def defer_tear_down(layer, key, tear_down):
+    """
+    Put off tearing down *layer* until the next layer is set up.
+    If that layer was set up with the same *key*, it can take
+    over the state of *layer* by calling :func:`take_deferred_layer`;
+    otherwise, *tear_down* is called by :func:`finish_deferred_tear_down`.
+
+    That also happens whenever :func:`zope.testing.cleanup.cleanUp` is called,
+    as it is when most other layers are set up, so they don't start
+    with our registrations, and when the process exits.
+    """
+    finish_deferred_tear_down()
+    global _deferred_tear_down
+    _deferred_tear_down = _DeferredTearDown(layer, key, tear_down)
+
+
+def take_deferred_layer(key):
+    """
+    If the layer whose tear down was deferred matches *key*,
+    and its pyramid settings are still registered, cancel its
+    tear down and return it. Otherwise, return None.
+    """
+    global _deferred_tear_down
+    deferred = _deferred_tear_down
+    if deferred is None or deferred.key != key:
+        return None
+    if deferred.settings is None or deferred.settings is not _current_settings():
+        # Somebody changed the registry behind our back
+        finish_deferred_tear_down()
+        return None
+    _deferred_tear_down = None
+    return deferred.layer
+
+
+def finish_deferred_tear_down():
+    """
+    Perform any tear down that was deferred.
+    """
+    global _deferred_tear_down
+    deferred = _deferred_tear_down
+    _deferred_tear_down = None
+    if deferred is not None:
+        deferred.tear_down()
+
+zope.testing.cleanup.addCleanUp(finish_deferred_tear_down)
+atexit.register(finish_deferred_tear_down)
+
+
+class DSInjectorMixin(object):
+    """
+    Like :class:`nti.dataserver.tests.mock_dataserver.DSInjectorMixin`,
+    which it uses, but the mock dataserver (and so the whole dataserver)
+    is only imported once a test is set up.
+    """
+
+    @classmethod
+    def setUpTestDS(cls, test=None):
+        from nti.dataserver.tests.mock_dataserver import DSInjectorMixin as mixin
+        return mixin.__dict__['setUpTestDS'].__get__(None, cls)(test)
+
+
 class PyramidLayerMixin(object):
 
     _mailer = None
@@ -64,6 +146,11 @@ class PyramidLayerMixin(object):
 
     request = None
     set_up_mailer = True
+    #: If true, setting up the mailer only sets up the
+    #: template renderers when a template is first rendered.
+    #: Defaults to the value of the environment variable named by
+    #: :data:`nti.app.testing.base.LAZY_RENDERERS_ENV`.
+    lazy_template_renderers = bool(os.environ.get(LAZY_RENDERERS_ENV))
 
     @classmethod
     def setUpPyramid(cls,
@@ -75,43 +162,43 @@ class PyramidLayerMixin(object):
         :return: The `Configurator`, which is also in ``self.config``.
         """
         __traceback_info__ = request_factory, request_args
-        cls._pwman = _PWManagerMixin()
-        cls._pwman.setUpPasswords()
-
-        # The demo storage has less strict requirements about
-        # being open/closed than a plain mapping storage
-        cls._storage_base = ZODB.DemoStorage.DemoStorage()
-
-        cls.config = psetUp(registry=component.getGlobalSiteManager(
-        ), request=cls.request, hook_zca=False)
-        cls.config.setup_registry()
-
-        if cls.set_up_mailer:
-            # Must provide the correct zpt template renderer or the email process blows up
-            # See application.py
-            cls.config.include('pyramid_chameleon')
-            cls.config.include('pyramid_mako')
-            component.provideUtility(z3c_zpt.renderer_factory,
-                                     IRendererFactory,
-                                     name=".pt")
-            cls._mailer = mailer = TestMailDelivery()
-            component.provideUtility(mailer, ITestMailDelivery)
-
-        if security_policy_factory:
-            cls.security_policy = security_policy_factory()
-            for iface in IAuthenticationPolicy, IAuthorizationPolicy:
-                if iface.providedBy(cls.security_policy) or force_security_policy:
-                    component.provideUtility(cls.security_policy, iface)
+        # Whatever was left behind can't be reused by us
+        finish_deferred_tear_down()
+        with timed_phase(cls, 'setUpPyramid'):
+            cls._pwman = _PWManagerMixin()
+            cls._pwman.setUpPasswords()
+
+            # The demo storage has less strict requirements about
+            # being open/closed than a plain mapping storage
+            cls._storage_base = ZODB.DemoStorage.DemoStorage()
+
+            cls.config = psetUp(registry=component.getGlobalSiteManager(
+            ), request=cls.request, hook_zca=False)
+            cls.config.setup_registry()
+
+            if cls.set_up_mailer:
+                _setup_template_renderers(cls.config,
+                                          cls.lazy_template_renderers)
+                cls._mailer = mailer = TestMailDelivery()
+                component.provideUtility(mailer, ITestMailDelivery)
+
+            if security_policy_factory:
+                cls.security_policy = security_policy_factory()
+                for iface in IAuthenticationPolicy, IAuthorizationPolicy:
+                    if iface.providedBy(cls.security_policy) or force_security_policy:
+                        component.provideUtility(cls.security_policy, iface)
         return cls.config
 
     @classmethod
     def tearDownPyramid(cls):
-        ptearDown()
-        cls._mailer = None
-        cls.security_policy = None
-        cls._pwman.tearDownPasswords()
-        cls._pwman = None
-        zope.testing.cleanup.cleanUp()
+        with timed_phase(cls, 'tearDownPyramid'):
+            ptearDown()
+            cls._mailer = None
+            cls.security_policy = None
+            cls._pwman.tearDownPasswords()
+            cls._pwman = None
+        with timed_phase(cls, 'cleanUp'):
+            zope.testing.cleanup.cleanUp()
         setHooks()  # but these must be back!
 
     @classmethod
@@ -161,7 +248,8 @@ class AppTestLayer(ZopeComponentLayer,
         setHooks()
         try:
             cls.setUpPyramid()
-            cls.setUpPackages()
+            with timed_phase(cls, 'setUpPackages'):
+                cls.setUpPackages()
         except:
             print("WARNING: failed to set up layer", cls, "; cleaning up")
             cls.tearDown()
@@ -169,9 +257,11 @@ class AppTestLayer(ZopeComponentLayer,
 
     @classmethod
     def tearDown(cls):
-        cls.tearDownPackages()
+        with timed_phase(cls, 'tearDownPackages'):
+            cls.tearDownPackages()
         cls.tearDownPyramid()
-        zope.testing.cleanup.cleanUp()
+        with timed_phase(cls, 'cleanUp'):
+            zope.testing.cleanup.cleanUp()
         setHooks()  # but these must be back!
 
     @classmethod
@@ -11,6 +11,8 @@ from __future__ import absolute_import
 # disable: accessing protected members, too many methods
 # pylint: disable=W0212,R0904
 
+from hamcrest.core.base_matcher import BaseMatcher
+
 from nti.testing.matchers import BoolMatcher
 
 __test__ = False
@@ -37,3 +39,103 @@ def has_permission(permission, request):
 
 def doesnt_have_permission(permission, request):
     return HasPermission(False, permission, request)
+
+
+class ResponseStatAtMost(BaseMatcher):
+    """
+    Matches a response from :func:`nti.app.testing.webtest.TestApp`
+    (or the statistics object attached to it as *attr*) whose
+    *stat* is no more than *limit*.
+    """
+
+    def __init__(self, attr, stat, limit):
+        super(ResponseStatAtMost, self).__init__()
+        self.attr = attr
+        self.stat = stat
+        self.limit = limit
+
+    def _stats(self, item):
+        return getattr(item, self.attr, item)
+
+    def _matches(self, item):
+        value = getattr(self._stats(item), self.stat, None)
+        return value is not None and value <= self.limit
+
+    def describe_to(self, description):
+        description.append_text('a response with %s %s at most '
+                                % (self.attr, self.stat))
+        description.append_description_of(self.limit)
+
+    def describe_mismatch(self, item, mismatch_description):
+        stats = self._stats(item)
+        if stats is None:
+            mismatch_description.append_text('%s was not recorded' % self.attr)
+            return
+        mismatch_description.append_text('%s was ' % self.stat)
+        mismatch_description.append_description_of(
+            getattr(stats, self.stat, None))
+        mismatch_description.append_text(' in ')
+        mismatch_description.append_description_of(stats)
+
+
+class _TransferCountAtMost(ResponseStatAtMost):
+    """
+    Doesn't match when the transfer counts were cleared during the
+    request, since *stat* may then be too low.
+    """
+
+    def __init__(self, stat, limit):
+        super(_TransferCountAtMost, self).__init__('zodb_stats', stat, limit)
+
+    def _matches(self, item):
+        return not getattr(self._stats(item), 'cleared', False) \
+           and super(_TransferCountAtMost, self)._matches(item)
+
+    def describe_mismatch(self, item, mismatch_description):
+        if getattr(self._stats(item), 'cleared', False):
+            mismatch_description.append_text(
+                'the transfer counts were cleared during the request in ')
+            mismatch_description.append_description_of(self._stats(item))
+            return
+        super(_TransferCountAtMost, self).describe_mismatch(item,
+                                                            mismatch_description)
+
+
+def loads_at_most(n):
+    """
+    Matches a response whose request loaded at most *n* objects from
+    ZODB storage. Requires ZODB statistics; see
+    :mod:`nti.app.testing.zodb_stats`.
+    """
+    return _TransferCountAtMost('loads', n)
+
+
+def stores_at_most(n):
+    """
+    Matches a response whose request stored at most *n* objects.
+    """
+    return _TransferCountAtMost('stores', n)
+
+
+def commits_at_most(n):
+    """
+    Matches a response whose request committed at most *n* transactions.
+    """
+    return ResponseStatAtMost('zodb_stats', 'commits', n)
+
+
+def allocates_at_most(n):
+    """
+    Matches a response whose request had at most *n* bytes
+    allocated at once. Requires allocation tracing; see
+    :mod:`nti.app.testing.allocations`.
+    """
+    return ResponseStatAtMost('allocation_stats', 'peak', n)
+
+
+def retains_at_most(n):
+    """
+    Matches a response whose request left at most *n* more bytes
+    allocated than before it started.
+    """
+    return ResponseStatAtMost('allocation_stats', 'net', n)
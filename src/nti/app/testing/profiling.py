@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Profiling the requests made by functional tests.
+
+When profiling is enabled, the pipeline built by
+:func:`nti.app.testing.webtest.TestApp` runs each request under
+:mod:`cProfile`. The profiles are added up by endpoint (see
+:func:`endpoint_key`) for the whole run, and when the process exits one
+``.pstats`` file per endpoint is written to the profile directory,
+ready for :mod:`pstats`, ``snakeviz`` or ``gprof2dot``.
+
+Enable it by setting the environment variable named by
+:data:`PROFILE_DIR_ENV` to a directory, or by passing
+``profile_dir`` to ``TestApp``.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import os
+import re
+import atexit
+import pstats
+import hashlib
+import cProfile
+
+from pyramid.interfaces import IContextFound
+
+from zope import component
+
+__test__ = False
+
+#: The name of an environment variable. If it is set, it names a
+#: directory that the profiles of all test requests are written to.
+PROFILE_DIR_ENV = 'NTI_APP_TESTING_PROFILE_DIR'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def profile_directory():
+    return os.environ.get(PROFILE_DIR_ENV) or None
+
+
+#: The key in the WSGI environment of a request under which
+#: :func:`_record_endpoint` stores the pattern of the matched route,
+#: the traversal context and the view name.
+ENDPOINT_KEY = 'nti.app.testing.endpoint'
+
+#: Path segments that are most likely identifiers, not part of
+#: the endpoint: numbers, hex strings and OIDs, or anything with
+#: the characters found in NTIIDs and usernames.
+_VARIABLE_SEGMENT = re.compile(r'^[0-9]+$|^(0x)?[0-9a-fA-F-]{8,}$|[:@%]')
+
+#: Path segments whose children are identifiers
+_IDENTIFIER_PARENTS = frozenset(('users', 'Objects', 'NTIIDs',
+                                 'ResolveUser', 'UserSearch'))
+
+
+def _path_pattern(path):
+    result = []
+    parent = None
+    for segment in path.split('/'):
+        # Views (@@name) are part of the endpoint
+        if not segment.startswith('@@') \
+            and (parent in _IDENTIFIER_PARENTS or _VARIABLE_SEGMENT.search(segment)):
+            result.append('*')
+        else:
+            result.append(segment)
+        parent = segment
+    return '/'.join(result)
+
+
+def _record_endpoint(event):
+    request = event.request
+    route = getattr(request, 'matched_route', None)
+    request.environ[ENDPOINT_KEY] = {
+        'route': getattr(route, 'pattern', None),
+        'context': type(getattr(request, 'context', None)).__name__,
+        'view_name': getattr(request, 'view_name', None) or '',
+    }
+
+
+def watch_endpoints(registry=None):
+    """
+    Subscribe to the :class:`pyramid.interfaces.IContextFound` events of
+    *registry*, the registry of a Pyramid application (the global site
+    manager by default), so that :func:`endpoint_key` knows the route or
+    context of its requests. Doing this more than once is harmless.
+    """
+    if registry is None:
+        registry = component.getGlobalSiteManager()
+    for registration in registry.registeredHandlers():
+        if registration.factory is _record_endpoint:
+            return
+    registry.registerHandler(_record_endpoint, (IContextFound,))
+
+
+def endpoint_key(environ):
+    """
+    Return a string identifying the endpoint that handled the request
+    with WSGI environment *environ*, once it has been handled.
+
+    This is the request method followed by the pattern of the
+    matched route, if there was one; otherwise the class of the
+    traversal context and the view name. Those are only known if the
+    application's registry is watched (see :func:`watch_endpoints`);
+    if not, it is the path, with the segments that look like
+    identifiers replaced by ``*``.
+    """
+    method = environ.get('REQUEST_METHOD', 'GET')
+    endpoint = environ.get(ENDPOINT_KEY)
+    if endpoint is not None:
+        if endpoint['route'] is not None:
+            return '%s %s' % (method, endpoint['route'])
+        return '%s %s@@%s' % (method, endpoint['context'],
+                              endpoint['view_name'])
+    return '%s %s' % (method, _path_pattern(environ.get('PATH_INFO', '/')))
+
+
+def _file_name(key):
+    # Readable, but different keys can look alike once cleaned up
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]
+    name = re.sub(r'[^A-Za-z0-9_.@-]+', '_', key).strip('_')
+    return '%s-%s.pstats' % (name, digest)
+
+
+class RequestProfiles(object):
+    """
+    The profiles of requests, added up by endpoint.
+    """
+
+    def __init__(self, directory=None):
+        #: Maps endpoint keys to :class:`pstats.Stats`
+        self.stats = {}
+        #: Where to write the profiles at exit, if not
+        #: :func:`profile_directory`
+        self.directory = directory
+
+    def profile(self, app, environ, start_response):
+        """
+        Call the WSGI *app* under the profiler and add the
+        profile to the stats for its endpoint.
+        """
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # pragma: no cover
+            # Another profiler is active, as in nested requests.
+            return app(environ, start_response)
+        try:
+            return app(environ, start_response)
+        finally:
+            profiler.disable()
+            self.add(endpoint_key(environ), profiler)
+
+    def add(self, key, profiler):
+        stats = self.stats.get(key)
+        if stats is None:
+            self.stats[key] = pstats.Stats(profiler)
+        else:
+            stats.add(profiler)
+
+    def write(self, directory):
+        """
+        Write a ``.pstats`` file for each endpoint into *directory*
+        and return their paths.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        paths = []
+        for key, stats in sorted(self.stats.items()):
+            path = os.path.join(directory, _file_name(key))
+            stats.dump_stats(path)
+            paths.append(path)
+        return paths
+
+
+#: The profiles of the requests made in this process that are written
+#: to :func:`profile_directory`.
+request_profiles = RequestProfiles()
+
+#: Maps other directories to the profiles written to them.
+_directory_profiles = {}
+
+
+def profiles_for(directory=None):
+    """
+    Return the :class:`RequestProfiles` that are written to *directory*
+    when the process exits: :data:`request_profiles`, if *directory*
+    is not given or is the :func:`profile_directory`, or profiles of
+    their own, shared by everything profiled into that directory.
+    """
+    if not directory or directory == profile_directory():
+        return request_profiles
+    profiles = _directory_profiles.get(directory)
+    if profiles is None:
+        profiles = _directory_profiles[directory] = RequestProfiles(directory)
+    return profiles
+
+
+def _write_profiles_at_exit():
+    for profiles in [request_profiles] + list(_directory_profiles.values()):
+        directory = profiles.directory or profile_directory()
+        if not directory or not profiles.stats:
+            continue
+        try:
+            profiles.write(directory)
+        except (IOError, OSError):  # pragma: no cover
+            logger.exception("Failed to write request profiles to %s",
+                             directory)
+
+atexit.register(_write_profiles_at_exit)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Recording the traffic of functional tests.
+
+If the environment variable named by :data:`RECORD_FILE_ENV` is set,
+every request made through :func:`nti.app.testing.webtest.TestApp` is
+appended to the file it names, one JSON object per line, with its
+method, path, headers, body and the status it got. Requests made
+through the same ``TestApp`` share a ``session``, so a replay can
+make them in order against the same data. If the file name ends with
+``.gz``, it is compressed.
+
+:mod:`nti.app.testing.replay` replays such files as a benchmark.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import io
+import os
+import gzip
+import json
+import base64
+import itertools
+
+__test__ = False
+
+#: The name of an environment variable. If it is set, it names a file
+#: that every test request is appended to.
+RECORD_FILE_ENV = 'NTI_APP_TESTING_RECORD_FILE'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, mode + 'b'), encoding='utf-8')
+    return io.open(path, mode, encoding='utf-8')
+
+
+def recorded_environ(environ):
+    """
+    Return the request headers (and content type) from the WSGI
+    *environ*.
+    """
+    return dict((k, v) for k, v in environ.items()
+                if k.startswith('HTTP_') or k == 'CONTENT_TYPE')
+
+
+def _encode_body(body):
+    try:
+        return {'body': body.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'body_b64': base64.b64encode(body).decode('ascii')}
+
+
+def decode_body(record):
+    """
+    Return the request body of *record* as bytes.
+    """
+    if 'body_b64' in record:
+        return base64.b64decode(record['body_b64'])
+    return record.get('body', u'').encode('utf-8')
+
+
+class TrafficRecorder(object):
+    """
+    Appends requests to a recording file.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._sessions = itertools.count()
+
+    @property
+    def path(self):
+        return self._path or os.environ.get(RECORD_FILE_ENV) or None
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def new_session(self):
+        return '%s-%s' % (os.getpid(), next(self._sessions))
+
+    def record(self, session, method, path, environ, body, status):
+        """
+        Append a request to the recording as part of *session*.
+        *environ* holds the headers, as returned by :func:`recorded_environ`,
+        and *status* is the status the request got.
+        """
+        record = {
+            'session': session,
+            'method': method,
+            'path': path,
+            'environ': environ,
+            'status': status,
+        }
+        if body:
+            record.update(_encode_body(body))
+        line = json.dumps(record, sort_keys=True)
+        with _open(self.path, 'a') as f:
+            f.write(line + u'\n')
+
+
+#: The recorder used by ``TestApp``
+traffic_recorder = TrafficRecorder()
+
+
+def read_recording(path):
+    """
+    Return a list of the requests recorded in *path*.
+    """
+    with _open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def sessions(records):
+    """
+    Group *records* by session, keeping the order in which the
+    sessions started and the order of the records within them.
+    """
+    result = {}
+    order = []
+    for record in records:
+        session = record.get('session')
+        if session not in result:
+            result[session] = []
+            order.append(session)
+        result[session].append(record)
+    return [result[session] for session in order]
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Helpers for the redis client of mock dataservers.
+
+Shared application tests used to call ``flushall`` on the redis client
+of their dataserver before each test, which costs time in proportion
+to what the previous test wrote. If :func:`redis_isolation_enabled`,
+:func:`reset_redis` instead gives the dataserver a new client with its
+own, empty, data, and simply drops the old one.
+
+Application layers can also keep a snapshot (see :func:`redis_snapshot`)
+of the redis data present once they are set up in their ``_redis_base``
+attribute; in isolation mode, it is restored into each test's fresh
+client, so the data doesn't have to be seeded again.
+
+To find endpoints that make too many round trips to redis, the client
+of a dataserver can be replaced by a :class:`CountingRedisClient` with
+:func:`count_redis_calls`. The pipeline built by
+:func:`nti.app.testing.webtest.TestApp` then records the commands
+issued during each request on the response as ``redis_calls``.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import os
+import collections
+
+from zope import component
+from zope import interface
+
+from nti.dataserver.interfaces import IRedisClient
+
+__test__ = False
+
+#: The name of an environment variable. If it is set to a non-empty
+#: value, each shared application test gets a new, empty, redis client
+#: instead of having the existing one flushed.
+REDIS_ISOLATION_ENV = 'NTI_APP_TESTING_ISOLATE_REDIS'
+
+#: The name of an environment variable. If it is set to a non-empty
+#: value, the redis commands of each shared application test are counted.
+REDIS_CALLS_ENV = 'NTI_APP_TESTING_COUNT_REDIS'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def redis_isolation_enabled():
+    return bool(os.environ.get(REDIS_ISOLATION_ENV))
+
+
+def redis_calls_enabled():
+    return bool(os.environ.get(REDIS_CALLS_ENV))
+
+
+def redis_snapshot(client):
+    """
+    Return a list of ``(key, ttl_ms, dumped_value)`` for all the keys
+    of *client*, suitable for :func:`restore_redis_snapshot`.
+    """
+    result = []
+    for key in client.keys('*'):
+        value = client.dump(key)
+        if value is None:  # pragma: no cover
+            # Expired while we looked
+            continue
+        ttl = client.pttl(key)
+        result.append((key, ttl if ttl and ttl > 0 else 0, value))
+    return result
+
+
+def restore_redis_snapshot(client, snapshot):
+    for key, ttl, value in snapshot or ():
+        client.restore(key, ttl, value)
+
+
+def fresh_redis_client(client):
+    """
+    Return a new client of the same kind as *client*, but with its
+    own empty data, or None if we don't know how to make one.
+
+    Only :mod:`fakeredis` clients are supported.
+    """
+    kind = type(client)
+    if not kind.__module__.startswith('fakeredis'):
+        return None
+    try:
+        from fakeredis import FakeServer
+    except ImportError:
+        # Before fakeredis 1.0
+        FakeServer = None
+    try:
+        if FakeServer is not None:
+            return kind(server=FakeServer())
+        return kind(singleton=False)
+    except TypeError:  # pragma: no cover
+        return None
+
+
+def redis_registrations(client):
+    """
+    Return the ``(provided, name, info)`` of each registration of
+    *client* as a utility of the global site manager.
+
+    Layers record these for the redis client of the dataserver they
+    create the application with, so that replacing the client of a
+    test's dataserver (which is registered the same way) only has to
+    look at those registrations.
+    """
+    return [(reg.provided, reg.name, reg.info)
+            for reg in component.getGlobalSiteManager().registeredUtilities()
+            if reg.component is client]
+
+
+def _replace_redis(ds, client, registrations=None):
+    """
+    Make *client* the redis client of *ds*, and register it in place
+    of the old client in the global and the current site managers for
+    each of *registrations* (see :func:`redis_registrations`) that
+    finds the old client. If they are not given, those of the old
+    client are looked up.
+    """
+    old = ds.redis
+    ds.redis = client
+    if registrations is None:
+        registrations = redis_registrations(old)
+    site_managers = [component.getGlobalSiteManager()]
+    if component.getSiteManager() is not site_managers[0]:
+        site_managers.append(component.getSiteManager())
+    for site_manager in site_managers:
+        for provided, name, info in registrations:
+            if site_manager.queryUtility(provided, name) is old:
+                site_manager.registerUtility(client, provided, name, info)
+
+
+@interface.implementer(IRedisClient)
+class CountingRedisClient(object):
+    """
+    Wraps a redis client and counts the commands called on it,
+    by name, in :attr:`calls`. A pipeline counts as one command,
+    ``pipeline``, however many commands it sends.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        #: A :class:`collections.Counter` of command names
+        self.calls = collections.Counter()
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        calls = self.calls
+
+        def command(*args, **kwargs):
+            calls[name] += 1
+            return attr(*args, **kwargs)
+        command.__name__ = name
+        return command
+
+    def __repr__(self):
+        return '<%s %r>' % (type(self).__name__, self.client)
+
+
+def count_redis_calls(ds, registrations=None):
+    """
+    Make sure the redis client of the dataserver *ds* is a
+    :class:`CountingRedisClient` and return it.
+
+    :param registrations: The result of :func:`redis_registrations`
+        for a client registered like that of *ds*, if known.
+    """
+    client = ds.redis
+    if not isinstance(client, CountingRedisClient):
+        client = CountingRedisClient(client)
+        _replace_redis(ds, client, registrations)
+    return client
+
+
+def stop_counting_redis_calls(ds, registrations=None):
+    """
+    Undo :func:`count_redis_calls`.
+    """
+    if isinstance(ds.redis, CountingRedisClient):
+        _replace_redis(ds, ds.redis.client, registrations)
+
+
+def reset_redis(ds, snapshot=None, restore=False, registrations=None):
+    """
+    Give the redis client of the dataserver *ds* the data in *snapshot*
+    and nothing else.
+
+    If :func:`redis_isolation_enabled` and possible, this installs a
+    :func:`fresh_redis_client`; otherwise, the existing client is flushed.
+    Outside of isolation mode, the snapshot is only restored if *restore*
+    is true; layer snapshots never were before.
+
+    If :func:`redis_calls_enabled`, the client is left counting its
+    commands.
+
+    *registrations* are passed to :func:`count_redis_calls`; layers
+    give their ``_redis_registrations``.
+    """
+    stop_counting_redis_calls(ds, registrations)
+    if redis_isolation_enabled():
+        _isolate_redis(ds, snapshot, registrations)
+    else:
+        ds.redis.flushall()
+        if restore:
+            restore_redis_snapshot(ds.redis, snapshot)
+    if redis_calls_enabled():
+        count_redis_calls(ds, registrations)
+
+
+def _isolate_redis(ds, snapshot, registrations):
+    client = fresh_redis_client(ds.redis)
+    try:
+        if client is not None:
+            _replace_redis(ds, client, registrations)
+    except AttributeError:  # pragma: no cover
+        # Can't set it
+        client = None
+    if client is None:
+        ds.redis.flushall()
+    restore_redis_snapshot(ds.redis, snapshot)
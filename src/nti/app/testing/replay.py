@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Replaying recorded functional test traffic as a benchmark.
+
+The files written by :mod:`nti.app.testing.recording` are replayed
+against a freshly set up application layer (by default
+:class:`nti.app.testing.application_webtest.ApplicationTestLayer`),
+and the throughput and the distribution of latencies are reported as
+JSON::
+
+    python -m nti.app.testing.replay --iterations 5 traffic.jsonl.gz
+
+Each recorded session is replayed, in order, in a test of the layer
+that has the users found in the recorded ``Authorization`` headers,
+created with the default password, so the requests of one session see
+the objects created by the earlier ones. Identifiers that were
+generated randomly when recording will not match, so some requests may
+get a different status than they did; those are counted, not fatal.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import sys
+import json
+import time
+import base64
+import argparse
+
+from six.moves import urllib_parse
+
+from nti.app.testing.harness import resolve
+from nti.app.testing.harness import layer_test
+from nti.app.testing.harness import nearest_rank
+from nti.app.testing.harness import layer_set_up
+
+from nti.app.testing.profiling import endpoint_key
+
+from nti.app.testing.recording import sessions
+from nti.app.testing.recording import decode_body
+from nti.app.testing.recording import read_recording
+
+from nti.app.testing.timing import peak_rss
+
+from nti.app.testing.zodb_stats import ZODB_STATS_KEY
+
+__test__ = False
+
+logger = __import__('logging').getLogger(__name__)
+
+DEFAULT_LAYER = 'nti.app.testing.application_webtest.ApplicationTestLayer'
+
+
+def recorded_usernames(records):
+    """
+    Return the sorted names of the users that authenticated
+    the *records* with Basic authentication.
+    """
+    result = set()
+    for record in records:
+        auth = record.get('environ', {}).get('HTTP_AUTHORIZATION', '')
+        if not auth.startswith('Basic '):
+            continue
+        try:
+            decoded = base64.b64decode(auth[6:]).decode('utf-8')
+        except (TypeError, ValueError):
+            continue
+        username = urllib_parse.unquote(decoded.partition(':')[0])
+        result.add(username.lower())
+    return sorted(result)
+
+
+def make_request(record):
+    from webtest.app import TestRequest
+    req = TestRequest.blank(str(record['path']),
+                            method=str(record['method']))
+    req.environ.update((str(k), str(v))
+                       for k, v in record.get('environ', {}).items())
+    body = decode_body(record)
+    if body:
+        req.body = body
+    return req
+
+
+def percentiles(samples, points=(50, 90, 95, 99)):
+    """
+    Return a dictionary describing the distribution of *samples*.
+    """
+    result = dict(('p%s' % p, nearest_rank(samples, p)) for p in points)
+    result['count'] = len(samples)
+    result['max'] = max(samples) if samples else 0.0
+    result['mean'] = sum(samples) / len(samples) if samples else 0.0
+    return result
+
+
+class _MeasuringMiddleware(object):
+
+    def __init__(self, app, measurements):
+        self.app = app
+        self.measurements = measurements
+
+    def __call__(self, environ, start_response):
+        start = time.time()
+        try:
+            return self.app(environ, start_response)
+        finally:
+            self.measurements.record(environ, time.time() - start,
+                                     environ.get(ZODB_STATS_KEY))
+
+
+class Measurements(object):
+    """
+    Collects the latency of requests made through a
+    :func:`nti.app.testing.webtest.TestApp` created with
+    :meth:`middleware`, in milliseconds, by endpoint, along with the
+    objects they loaded from ZODB. Requests whose transfer counts were
+    cleared (see :mod:`nti.app.testing.zodb_stats`) are left out of the
+    loads, and counted as ``zodb_cleared_requests``.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.requests = 0
+        self.status_mismatches = 0
+        self.loads = []
+        self.cleared = 0
+        self.elapsed = 0.0
+
+    def middleware(self, app):
+        """
+        Wrap the WSGI application *app* to measure each request; pass
+        this as the ``middleware`` of :func:`nti.app.testing.webtest.TestApp`.
+        """
+        return _MeasuringMiddleware(app, self)
+
+    def record(self, environ, elapsed, zodb_stats=None):
+        """
+        Record that the request described by *environ* took
+        *elapsed* seconds.
+        """
+        self.elapsed += elapsed
+        self.requests += 1
+        self.latencies.setdefault(endpoint_key(environ),
+                                  []).append(elapsed * 1000.0)
+        if zodb_stats is not None and getattr(zodb_stats, 'cleared', False):
+            self.cleared += 1
+        elif zodb_stats is not None:
+            self.loads.append(zodb_stats.loads)
+
+    def report(self):
+        everything = [l for ls in self.latencies.values() for l in ls]
+        return {
+            'requests': self.requests,
+            'seconds': self.elapsed,
+            'requests_per_second': (self.requests / self.elapsed
+                                    if self.elapsed else 0.0),
+            'latency_ms': percentiles(everything),
+            'endpoints': dict((key, percentiles(samples))
+                              for key, samples in self.latencies.items()),
+            'zodb_loads_per_request': percentiles(self.loads),
+            'zodb_cleared_requests': self.cleared,
+            'status_mismatches': self.status_mismatches,
+        }
+
+
+class Replay(Measurements):
+    """
+    Replays sessions of recorded requests.
+    """
+
+    def replay_session(self, testapp, records):
+        """
+        Make the requests of *records* with *testapp*, which must
+        have been created with our :meth:`middleware`.
+        """
+        for record in records:
+            res = testapp.do_request(make_request(record), expect_errors=True)
+            expected_status = record.get('status')
+            if expected_status is not None and res.status_int != expected_status:
+                self.status_mismatches += 1
+
+
+def replay(records, layer=DEFAULT_LAYER, iterations=1, duration=None):
+    """
+    Replay *records* against a new *layer* (a layer or its dotted name),
+    *iterations* times, or until *duration* seconds have passed if given.
+    Return the report as a dictionary.
+    """
+    from nti.app.testing.decorators import WithSharedApplicationMockDS
+    from nti.app.testing.application_webtest import ApplicationLayerTest
+    from nti.app.testing.webtest import TestApp
+
+    if not hasattr(layer, 'setUp'):
+        layer = resolve(layer)
+    grouped = sessions(records)
+    result = Replay()
+    base_user = ApplicationLayerTest.default_username.lower()
+    users = tuple(u for u in recorded_usernames(records) if u != base_user)
+
+    class ReplayTest(ApplicationLayerTest):
+
+        session = ()
+
+        @WithSharedApplicationMockDS(users=users or True, testapp=False)
+        def test_replay_session(self):
+            testapp = TestApp(self.app, middleware=result.middleware,
+                              zodb_stats=True)
+            result.replay_session(testapp, self.session)
+    ReplayTest.layer = layer
+
+    rss = peak_rss()
+    with layer_set_up(layer) as layers:
+        start = time.time()
+        iteration = 0
+        while True:
+            if duration is not None:
+                if time.time() - start >= duration:
+                    break
+            elif iteration >= iterations:
+                break
+            iteration += 1
+            for session in grouped:
+                test = ReplayTest('test_replay_session')
+                test.session = session
+                with layer_test(layers, test):
+                    test.debug()
+    report = result.report()
+    report['iterations'] = iteration
+    if rss is not None:
+        report['peak_rss_growth'] = peak_rss() - rss
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay recorded test traffic as a benchmark")
+    parser.add_argument('recordings', nargs='+',
+                        help="Files written with NTI_APP_TESTING_RECORD_FILE")
+    parser.add_argument('--layer', default=DEFAULT_LAYER,
+                        help="Dotted name of the application layer to use")
+    parser.add_argument('--iterations', type=int, default=1,
+                        help="How many times to replay everything")
+    parser.add_argument('--duration', type=float, default=None,
+                        help="Replay for this many seconds instead")
+    parser.add_argument('--output', default=None,
+                        help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    records = []
+    for path in args.recordings:
+        records.extend(read_recording(path))
+    report = replay(records, args.layer, args.iterations, args.duration)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A nose2 plugin that orders layers to reduce the total cost of
+setting them up.
+
+The plugin records how long each layer takes to set up, keeping a
+running average in a JSON file between runs. When a run starts, the
+layer suites built by :mod:`nose2.plugins.layers` are reordered at
+each level of the layer tree so that layers that would create
+identically configured applications (the same ``features``,
+``APP_IN_DEVMODE`` and extra application settings) run next to each
+other, which lets
+:attr:`nti.app.testing.application_webtest.AppCreatingLayerHelper.REUSE_APP`
+skip rebuilding the application between them, and so that within a
+group cheaper layers run first.
+
+This module requires nose2, which is not a dependency of this
+package; install the ``scheduling`` extra to get it. To use it, list
+it after the layers plugin in ``nose2.cfg``::
+
+    [unittest]
+    plugins = nose2.plugins.layers
+              nti.app.testing.scheduling
+
+    [layer-scheduler]
+    always-on = True
+    cost-file = .layer-costs.json
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import os
+import json
+import time
+
+from nose2.events import Plugin
+
+from nose2.suite import LayerSuite
+
+from nti.app.testing.timing import layer_name
+
+__test__ = False
+
+logger = __import__('logging').getLogger(__name__)
+
+#: How much weight the latest measurement of a layer's cost gets
+#: in its running average.
+SMOOTHING = 0.5
+
+
+def layer_group(layer):
+    """
+    Return a key that is equal for layers that configure the
+    application the same way.
+    """
+    settings = getattr(layer, '_extra_app_settings', None)
+    try:
+        settings = settings() if settings is not None else {}
+    except Exception:  # pylint:disable=broad-except
+        settings = {}
+    return (repr(tuple(sorted(getattr(layer, 'features', None) or ()))),
+            repr(getattr(layer, 'APP_IN_DEVMODE', None)),
+            repr(sorted((str(k), repr(v)) for k, v in settings.items())))
+
+
+def order_layers(layers, cost):
+    """
+    Return *layers* sorted so that those with the same
+    :func:`layer_group` are together, cheapest groups first, and the
+    cheapest layers first within each group. *cost* is a callable
+    returning the expected set up cost of a layer.
+    """
+    groups = {}
+    for layer in layers:
+        groups.setdefault(layer_group(layer), []).append(layer)
+    for members in groups.values():
+        members.sort(key=lambda l: (cost(l), layer_name(l)))
+    ordered = sorted(groups.values(),
+                     key=lambda members: (sum(cost(l) for l in members),
+                                          layer_name(members[0])))
+    return [layer for members in ordered for layer in members]
+
+
+class LayerScheduler(Plugin):
+    """
+    Records layer set up times and reorders layer suites by them.
+    """
+
+    configSection = 'layer-scheduler'
+    commandLineSwitch = (None, 'layer-scheduler',
+                         'Order layers by their recorded set up cost')
+
+    def __init__(self):
+        self.cost_file = self.config.as_str('cost-file', '.layer-costs.json')
+        self.costs = self._load()
+        self._started = {}
+
+    def _load(self):
+        if not os.path.exists(self.cost_file):
+            return {}
+        try:
+            with open(self.cost_file) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            logger.exception("Ignoring unreadable layer costs in %s",
+                             self.cost_file)
+            return {}
+
+    def cost(self, layer):
+        return self.costs.get(layer_name(layer), 0.0)
+
+    def startLayerSetup(self, event):
+        self._started[event.layer] = time.time()
+
+    def stopLayerSetup(self, event):
+        start = self._started.pop(event.layer, None)
+        if start is None:
+            return
+        name = layer_name(event.layer)
+        duration = time.time() - start
+        previous = self.costs.get(name)
+        if previous is not None:
+            duration = SMOOTHING * duration + (1 - SMOOTHING) * previous
+        self.costs[name] = duration
+
+    def startTestRun(self, event):
+        self._reorder(event.suite)
+
+    def _reorder(self, suite):
+        tests = getattr(suite, '_tests', None)
+        if tests is None:
+            return
+        layer_suites = [t for t in tests if isinstance(t, LayerSuite)]
+        for layer_suite in layer_suites:
+            self._reorder(layer_suite)
+        if len(layer_suites) < 2:
+            return
+        by_layer = {}
+        for layer_suite in layer_suites:
+            by_layer.setdefault(layer_suite.layer, []).append(layer_suite)
+        ordered = order_layers(list(by_layer), self.cost)
+        others = [t for t in tests if not isinstance(t, LayerSuite)]
+        tests[:] = others + [s for layer in ordered for s in by_layer[layer]]
+
+    def stopTestRun(self, event):
+        try:
+            with open(self.cost_file, 'w') as f:
+                json.dump(self.costs, f, indent=2, sort_keys=True)
+        except (IOError, OSError):
+            logger.exception("Failed to save layer costs to %s",
+                             self.cost_file)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Helpers for working with the ZODB storages that application layers
+use as the base of their per-test dataservers.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import os
+import sys
+import hashlib
+
+import pkg_resources
+
+from ZODB.DemoStorage import DemoStorage
+
+from ZODB.FileStorage import FileStorage
+
+from ZODB.POSException import POSKeyError
+
+try:
+    from ZODB.Connection import TransactionMetaData
+except ImportError:  # pragma: no cover
+    # ZODB 4 storages accept the iterated transactions themselves
+    TransactionMetaData = None
+
+from ZODB.utils import z64
+
+__test__ = False
+
+#: The name of an environment variable. If it is set, it names a directory
+#: where snapshots of the storage built by application layers are
+#: saved and loaded from. If it is not set, no snapshots are used.
+SNAPSHOT_DIR_ENV = 'NTI_APP_TESTING_SNAPSHOT_DIR'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _current_serial(storage, oid):
+    try:
+        return storage.load(oid, '')[1]
+    except POSKeyError:
+        return z64
+
+
+def copy_transactions(source, dest):
+    """
+    Copy each transaction found by iterating *source* into *dest*,
+    preserving object ids.
+
+    *dest* need not support ``restore``; object serials are tracked
+    here so that plain ``store`` calls don't produce conflicts. Objects
+    that *dest* already has (as when it is a demo storage whose base
+    has them) are replaced.
+    """
+    serials = {}
+    for record_txn in source.iterator():
+        # The iterated records aren't transactions a storage can commit
+        # in ZODB 5 (they lack ``extension_bytes``, for one)
+        txn = record_txn
+        if TransactionMetaData is not None:
+            txn = TransactionMetaData(record_txn.user,
+                                      record_txn.description,
+                                      record_txn.extension)
+        dest.tpc_begin(txn)
+        oids = []
+        for record in record_txn:
+            if record.data is None:  # pragma: no cover
+                # An undone creation; nothing to copy
+                continue
+            if record.oid not in serials:
+                serials[record.oid] = _current_serial(dest, record.oid)
+            dest.store(record.oid, serials[record.oid],
+                       record.data, '', txn)
+            oids.append(record.oid)
+        dest.tpc_vote(txn)
+        dest.tpc_finish(txn)
+        tid = dest.lastTransaction()
+        for oid in oids:
+            serials[oid] = tid
+
+
+def snapshot_directory():
+    """
+    Return the directory snapshots are kept in, or None if
+    snapshots are disabled.
+    """
+    return os.environ.get(SNAPSHOT_DIR_ENV) or None
+
+
+def _distribution_versions():
+    return sorted((dist.project_name, dist.version)
+                  for dist in pkg_resources.working_set)
+
+
+def snapshot_fingerprint(features, devmode, settings):
+    """
+    Return a string identifying the storage produced by creating
+    the application with the given arguments in the current environment.
+
+    The installed distributions and their versions are part of the
+    fingerprint so that upgrading a package (and thus possibly its
+    generations) doesn't load a stale snapshot. Note that changing
+    the code of a develop checkout without changing its version is
+    *not* detected; clear the snapshot directory if you do that.
+    """
+    parts = (sys.version_info[:3],
+             tuple(sorted(features or ())),
+             bool(devmode),
+             sorted((str(k), repr(v)) for k, v in (settings or {}).items()),
+             _distribution_versions())
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def snapshot_path(fingerprint, directory=None):
+    directory = directory or snapshot_directory()
+    return os.path.join(directory, 'app-base-%s.fs' % fingerprint)
+
+
+def load_storage_snapshot(fingerprint, directory=None):
+    """
+    If a snapshot exists for *fingerprint*, load it into a new
+    in-memory :class:`ZODB.DemoStorage.DemoStorage` and return that.
+    Otherwise return None.
+    """
+    directory = directory or snapshot_directory()
+    if not directory:
+        return None
+    path = snapshot_path(fingerprint, directory)
+    if not os.path.exists(path):
+        return None
+
+    result = DemoStorage()
+    snapshot = FileStorage(path, read_only=True)
+    try:
+        copy_transactions(snapshot, result)
+    except Exception:  # pylint:disable=broad-except
+        logger.exception("Failed to load storage snapshot %s; ignoring",
+                         path)
+        result.close()
+        result = None
+    finally:
+        snapshot.close()
+    return result
+
+
+def save_storage_snapshot(storage, fingerprint, directory=None):
+    """
+    Copy all the transactions of *storage* into a snapshot file
+    for *fingerprint*. The file is written under a temporary name and
+    moved into place, so concurrent test processes never see
+    partial snapshots.
+
+    Failures to write the file are logged, not raised: snapshots are
+    only a performance optimization. Other errors are raised.
+
+    :return: The path of the snapshot, or None if it wasn't saved.
+    """
+    directory = directory or snapshot_directory()
+    if not directory:
+        return None
+    path = snapshot_path(fingerprint, directory)
+    tmp_path = '%s.%s.tmp' % (path, os.getpid())
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        dest = FileStorage(tmp_path, create=True)
+        try:
+            copy_transactions(storage, dest)
+        finally:
+            dest.close()
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        logger.warning("Failed to save storage snapshot %s", path,
+                       exc_info=True)
+        path = None
+    finally:
+        for suffix in ('', '.index', '.lock', '.tmp'):
+            if os.path.exists(tmp_path + suffix):
+                os.remove(tmp_path + suffix)
+    return path
+
+
+def stack_changes(storage, base):
+    """
+    Return a new :class:`ZODB.DemoStorage.DemoStorage` on top of *base*
+    holding a copy of the changes made to the demo storage *storage*,
+    whose base must have the same contents as *base*. Closing it
+    doesn't close *base*.
+    """
+    result = DemoStorage(base=base, close_base_on_close=False)
+    copy_transactions(storage.changes, result)
+    return result
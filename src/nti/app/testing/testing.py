@@ -59,9 +59,9 @@ class ITestMailDelivery(IMailer, IMailDelivery):
     pass
 
 
-import webtest.lint
-
-from webtest.lint import check_headers as _orig_check_headers
+#: The original :func:`webtest.lint.check_headers`, once we have
+#: replaced it.
+_orig_check_headers = None
 
 
 def unicode_check_headers(headers):
@@ -71,7 +71,10 @@ def unicode_check_headers(headers):
     this is required (if not in the spec, then in the implementation
     provided in gevent 1.0rc1). This check causes that to happen.
     """
-    _orig_check_headers(headers)
+    orig_check_headers = _orig_check_headers
+    if orig_check_headers is None:
+        from webtest.lint import check_headers as orig_check_headers
+    orig_check_headers(headers)
     for k, v in headers:
         assert_that(k, is_(str), 'Header names must be strings')
         assert_that(v, is_(str), 'Header values must be strings')
@@ -79,22 +82,23 @@ def unicode_check_headers(headers):
 
 def monkey_patch_check_headers():
     """
-    Patches webtest.lint to use :func:`unicode_check_headers`. This module
-    does this on import.
+    Patches webtest.lint to use :func:`unicode_check_headers`. This is
+    done by :func:`patch_webtest`.
     """
+    global _orig_check_headers
+    import webtest.lint
     module = getattr(webtest.lint.check_headers, '__module__', None)
     if module == 'webtest.lint':
+        _orig_check_headers = webtest.lint.check_headers
         webtest.lint.check_headers = unicode_check_headers
 
-monkey_patch_check_headers()
-
-import simplejson
-
 
 def monkey_patch_webtest_json_to_simplejson():
     """
     Make webtest use the faster simplejson dump/load functions.
     """
+    import simplejson
+    import webtest.app
 
     from webtest import compat
     compat.loads = simplejson.loads
@@ -110,13 +114,35 @@ def monkey_patch_webtest_json_to_simplejson():
     # Added in 2.0.15: the ability to set a JSONEncoder in the app;
     # we have to patch it to keep consistent
     webtest.app.json = simplejson
-monkey_patch_webtest_json_to_simplejson()
 
 
 def monkey_patch_webtest_form20_to_not_be_stupid():
     from webtest import forms
     forms.Field.value = None  # Idiot thing is broken in 2.0
-monkey_patch_webtest_form20_to_not_be_stupid()
+
+
+_webtest_patched = False
+
+
+def patch_webtest():
+    """
+    Apply all the patches to :mod:`webtest` defined in this module,
+    once.
+
+    Importing webtest is not free, and most uses of this package
+    don't need it, so this is not done when this module is imported.
+    Instead, the test apps of :mod:`nti.app.testing.webtest` call this
+    when they are created. Code that uses :class:`webtest.TestApp`
+    directly must call it first.
+    """
+    global _webtest_patched
+    if _webtest_patched:
+        return
+    _webtest_patched = True
+    monkey_patch_check_headers()
+    monkey_patch_webtest_json_to_simplejson()
+    monkey_patch_webtest_form20_to_not_be_stupid()
+
 
 from nti.app.testing.request_response import DummyRequest
 
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+from nti.app.testing import allocations
+
+
+def _app(environ, unused_start_response):
+    environ['kept'] = [bytearray(1000) for _ in range(100)]
+    return [b'']
+
+
+@unittest.skipIf(allocations.tracemalloc is None, "Requires tracemalloc")
+class TestAllocations(unittest.TestCase):
+
+    def tearDown(self):
+        allocations.tracemalloc.stop()
+
+    def _check(self, stats):
+        self.assertGreaterEqual(stats.net, 100000)
+        self.assertGreaterEqual(stats.peak, stats.net)
+        site, size, count = stats.top[0]
+        self.assertIn('test_allocations.py', site)
+        self.assertGreaterEqual(size, 100000)
+        self.assertGreaterEqual(count, 100)
+
+    def test_measure_allocations(self):
+        environ = {}
+        result, stats = allocations.measure_allocations(_app, environ, None)
+        self.assertEqual(result, [b''])
+        self._check(stats)
+        # We started tracing, so we stopped it
+        self.assertFalse(allocations.tracemalloc.is_tracing())
+
+    def test_already_tracing(self):
+        allocations.tracemalloc.start()
+        _, stats = allocations.measure_allocations(_app, {}, None)
+        self._check(stats)
+        self.assertTrue(allocations.tracemalloc.is_tracing())
+
+    def test_without_sites(self):
+        with mock.patch.object(allocations, '_snapshot') as snapshot:
+            _, stats = allocations.measure_allocations(_app, {}, None, top=0)
+        self.assertGreaterEqual(stats.net, 100000)
+        self.assertEqual(stats.top, ())
+        self.assertFalse(snapshot.called)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+from six import StringIO
+
+from zope.testrunner.runner import Runner
+
+from nti.app.testing import application_webtest
+
+from nti.app.testing.application_webtest import ApplicationTestLayer
+from nti.app.testing.application_webtest import ApplicationLayerTest
+from nti.app.testing.application_webtest import AppCreatingLayerHelper
+
+from nti.app.testing.layers import finish_deferred_tear_down
+
+
+def _sibling_layer(name):
+    # A separate layer configured exactly like ApplicationTestLayer,
+    # as the layers of other packages are, not a subclass of it
+    names = ('features', 'set_up_packages', 'APP_IN_DEVMODE',
+             'configure_events', '_setup_library', '_extra_app_settings',
+             'setUp', 'tearDown', 'testSetUp', 'testTearDown')
+    attrs = dict((n, ApplicationTestLayer.__dict__[n]) for n in names)
+    attrs['__module__'] = __name__
+    return type(name, ApplicationTestLayer.__bases__, attrs)
+
+
+class TestSiblingLayerTakeOver(unittest.TestCase):
+
+    def _suite(self, layers, apps):
+        suite = unittest.TestSuite()
+        for layer in layers:
+
+            class Test(unittest.TestCase):
+
+                def test_app(self):
+                    apps.append((self.layer, self.app))
+            Test.layer = layer
+            suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(Test))
+        return suite
+
+    def test_second_layer_takes_over(self):
+        layers = [_sibling_layer('FirstLayer'), _sibling_layer('SecondLayer')]
+        apps = []
+        create_app = application_webtest._create_app
+        with mock.patch.object(AppCreatingLayerHelper, 'REUSE_APP', True), \
+             mock.patch.object(application_webtest, '_create_app',
+                               side_effect=create_app) as created, \
+             mock.patch('sys.stdout', new_callable=StringIO):
+            runner = Runner(args=['test'],
+                            found_suites=[self._suite(layers, apps)])
+            try:
+                runner.run()
+            finally:
+                # The last layer's tear down was deferred too
+                finish_deferred_tear_down()
+
+        self.assertFalse(runner.failed)
+        self.assertEqual([layer for layer, _ in apps], layers)
+        # The application was created once, for the first layer
+        self.assertEqual(created.call_count, 1)
+        self.assertIs(apps[0][1], apps[1][1])
+
+
+class _DB(object):
+
+    tid = b'1'
+
+    def lastTransaction(self):
+        return self.tid
+
+
+class _TestApp(object):
+
+    def __init__(self):
+        self.extra_environ = {}
+        self.cookies = {}
+        self.fetched = 0
+
+    def get(self, path):
+        self.fetched += 1
+        return (path, self.fetched)
+
+
+class _Test(ApplicationLayerTest):
+
+    cache_service_doc = True
+
+    def __init__(self):
+        super(_Test, self).__init__('test_nothing')
+        self.db = _DB()
+
+    @property
+    def ds(self):
+        return mock.Mock(db=self.db)
+
+    def test_nothing(self):
+        pass
+
+
+class TestServiceDocCache(unittest.TestCase):
+
+    def test_fetched_again_after_commit(self):
+        test = _Test()
+        first, second = _TestApp(), _TestApp()
+        doc = test.fetch_service_doc(first)
+        self.assertIs(test.fetch_service_doc(first), doc)
+        # Each test app has its own
+        test.fetch_service_doc(second)
+        self.assertEqual((first.fetched, second.fetched), (1, 1))
+
+        test.db.tid = b'2'
+        self.assertIsNot(test.fetch_service_doc(first), doc)
+        self.assertEqual(first.fetched, 2)
+
+    def test_not_cached(self):
+        test = _Test()
+        testapp = _TestApp()
+        test.fetch_service_doc(testapp, cached=False)
+        test.fetch_service_doc(testapp, cached=False)
+        self.assertEqual(testapp.fetched, 2)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
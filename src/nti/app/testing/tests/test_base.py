@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+from zope import component
+
+from pyramid.config import Configurator
+
+from pyramid.interfaces import IRendererFactory
+
+from pyramid.registry import Registry
+
+from nti.app.testing import base
+
+
+class _User(object):
+
+    def __init__(self, username, events):
+        self.username = username
+        self.events = events
+
+    def record_dynamic_membership(self, community):
+        self.events.append(('member', self.username, community))
+
+
+class _Test(base._TestBaseMixin):
+
+    default_community = u'community'
+
+    def __init__(self):
+        self.ds = object()
+        self.events = []
+
+    def _assign_role(self, role, username=None):
+        self.events.append(('role', username))
+
+
+class _DefaultRoles(_Test):
+    _assign_role = base._TestBaseMixin._assign_role
+
+
+class TestCreateUsers(unittest.TestCase):
+
+    def _create_users(self, test, usernames, **kwargs):
+        events = test.events
+
+        def create_user(_ds, username, password, **kwargs):
+            events.append(('user', username))
+            if kwargs:
+                events.append(('kwargs', kwargs))
+            return _User(username, events)
+
+        def get_community(name, _ds):
+            events.append(('get_community', name))
+
+        def create_community(_ds, username):
+            events.append(('create_community', username))
+            return username
+
+        community = mock.Mock(get_community=get_community,
+                              create_community=create_community)
+        with mock.patch.object(base, 'User', mock.Mock(create_user=create_user)), \
+             mock.patch.object(base, 'Community', community):
+            return test._create_users(usernames, **kwargs)
+
+    def test_same_calls_as_create_user(self):
+        test = _Test()
+        users = self._create_users(test, (None, u'jason@nextthought.com',
+                                          u'other'))
+        self.assertEqual([u.username for u in users],
+                         [u'sjohnson@nextthought.com', u'jason@nextthought.com',
+                          u'other'])
+        self.assertEqual(test.events, [
+            # The community is found after the first user exists, as before
+            ('user', u'sjohnson@nextthought.com'),
+            ('get_community', u'community'),
+            ('create_community', u'community'),
+            ('member', u'sjohnson@nextthought.com', u'community'),
+            # Roles are still assigned with the overridable method
+            ('role', u'sjohnson@nextthought.com'),
+            ('user', u'jason@nextthought.com'),
+            ('member', u'jason@nextthought.com', u'community'),
+            ('role', u'jason@nextthought.com'),
+            ('user', u'other'),
+            ('member', u'other', u'community'),
+        ])
+
+    def test_extra_interfaces(self):
+        test = _Test()
+        test.default_community = None
+        self._create_users(test, (None, u'other'), extra_interfaces=())
+        # As _create_user always did, they are passed on for the default user
+        self.assertEqual(test.events, [('user', u'sjohnson@nextthought.com'),
+                                       ('kwargs', {'extra_interfaces': ()}),
+                                       ('role', u'sjohnson@nextthought.com'),
+                                       ('user', u'other')])
+
+    def test_role_manager_found_once(self):
+        test = _DefaultRoles()
+        test.default_community = None
+        with mock.patch.object(base._TestBaseMixin, '_role_manager') as manager:
+            self._create_users(test, (None, u'jason@nextthought.com', u'other'))
+        self.assertEqual(manager.call_count, 1)
+        self.assertEqual(
+            [args for args, _ in manager().assignRoleToPrincipal.call_args_list],
+            [(mock.ANY, u'sjohnson@nextthought.com'),
+             (mock.ANY, u'jason@nextthought.com')])
+
+    def test_without_community(self):
+        test = _Test()
+        test.default_community = None
+        self._create_users(test, (u'other',))
+        self.assertEqual(test.events, [('user', u'other')])
+
+
+class _Factory(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, info):
+        return (self.name, info)
+
+
+class TestLazyRenderers(unittest.TestCase):
+
+    def setUp(self):
+        # Not the global registry
+        self.config = Configurator(registry=Registry('test'))
+        self.config.setup_registry()
+        self.included = []
+
+    def _include(self, config):
+        self.included.append(config.registry)
+        for name in base._LazyRendererFactory.names:
+            config.registry.registerUtility(_Factory(name), IRendererFactory,
+                                            name=name)
+
+    def _renderer(self, name):
+        return self.config.registry.getUtility(IRendererFactory, name=name)
+
+    def test_included_once_in_the_config_registry(self):
+        base._setup_template_renderers(self.config, lazy=True)
+        placeholders = [self._renderer(name)
+                        for name in base._LazyRendererFactory.names]
+        self.assertTrue(all(isinstance(p, base._LazyRendererFactory)
+                            for p in placeholders))
+        self.assertIsNone(component.queryUtility(IRendererFactory, name='.mak'))
+
+        with mock.patch.object(base, '_include_template_renderers',
+                               self._include):
+            # Placeholders held on to before the include still work
+            for placeholder in placeholders:
+                self.assertEqual(placeholder('info'), (placeholder.name, 'info'))
+        self.assertEqual(self.included, [self.config.registry])
+        self.assertIsInstance(self._renderer('.mak'), _Factory)
+
+    def test_set_up_again(self):
+        with mock.patch.object(base, '_include_template_renderers',
+                               self._include):
+            for _ in range(2):
+                base._setup_template_renderers(self.config, lazy=True)
+                self.assertEqual(self._renderer('.pt')('info'), ('.pt', 'info'))
+        self.assertEqual(len(self.included), 2)
+
+    def test_zpt_in_the_config_registry(self):
+        z3c_zpt = mock.Mock(renderer_factory=_Factory('.pt'))
+        modules = {'nti.app.pyramid_zope': mock.Mock(z3c_zpt=z3c_zpt),
+                   'nti.app.pyramid_zope.z3c_zpt': z3c_zpt}
+        base._setup_template_renderers(self.config, lazy=True)
+        with mock.patch.dict('sys.modules', modules), \
+             mock.patch.object(self.config, 'include'):
+            self.assertEqual(self._renderer('.pt')('info'), ('.pt', 'info'))
+        self.assertIs(self._renderer('.pt'), z3c_zpt.renderer_factory)
+        self.assertIsNone(component.queryUtility(IRendererFactory, name='.pt'))
+
+    def test_missing_renderer(self):
+        base._setup_template_renderers(self.config, lazy=True)
+        with mock.patch.object(base, '_include_template_renderers',
+                               lambda config: None):
+            self.assertRaises(LookupError, self._renderer('.pt'), 'info')
+
+
+def _link(rel, href):
+    return {'rel': rel, 'href': href}
+
+
+class TestLinks(unittest.TestCase):
+
+    def test_first_link_wins(self):
+        ext = {'Links': [_link('edit', '/a'), _link('edit', '/b')]}
+        self.assertEqual(_Test().link_href_with_rel(ext, 'edit'), '/a')
+        self.assertEqual(_Test().links_by_rel(ext), {'edit': ext['Links'][0]})
+
+    def test_links_by_rel_of_each_item(self):
+        items = [{'Links': [_link('edit', '/a'), _link('like', '/b')]},
+                 {}]
+        self.assertEqual(_Test().links_by_rel(items),
+                         [{'edit': items[0]['Links'][0],
+                           'like': items[0]['Links'][1]},
+                          {}])
+        # A single object gets a single dictionary
+        self.assertEqual(_Test().links_by_rel(items[1]), {})
+
+    def test_require_links(self):
+        test = _Test()
+        items = [{'Links': [_link('edit', '/a'), _link('like', '/b')]},
+                 {'Links': [_link('edit', '/c')]},
+                 {}]
+        self.assertEqual(test.require_links(items[0], ('edit', 'like')),
+                         {'edit': '/a', 'like': '/b'})
+        self.assertEqual(test.require_links(items[:2], ('edit',)),
+                         [{'edit': '/a'}, {'edit': '/c'}])
+        with self.assertRaises(AssertionError) as exc:
+            test.require_links(items, ('edit', 'like'))
+        # Every missing pair is reported
+        message = str(exc.exception)
+        for missing in ((1, 'like'), (2, 'edit'), (2, 'like')):
+            self.assertIn(repr(missing), message)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import unittest
+
+from nti.app.testing import cache_reset
+
+
+class _Cache(object):
+
+    def __init__(self, oids):
+        self.oids = oids
+
+    def lru_items(self):
+        return [(oid, None) for oid in self.oids]
+
+
+class _Connection(object):
+
+    def __init__(self, oids):
+        self._cache = _Cache(oids)
+
+
+class _DB(object):
+
+    def __init__(self, *oids):
+        self.conns = [_Connection(list(oids))]
+
+    def cacheSize(self):
+        return sum(len(c._cache.oids) for c in self.conns)
+
+    def _connectionMap(self, func):
+        for conn in self.conns:
+            func(conn)
+
+
+class TestPolicies(unittest.TestCase):
+
+    def test_parse(self):
+        policy = cache_reset.parse_cache_reset_policy
+        self.assertIsInstance(policy('always'), cache_reset.AlwaysReset)
+        self.assertIsInstance(policy('Never'), cache_reset.NeverReset)
+        self.assertEqual(policy('every:3').n, 3)
+        self.assertEqual(policy('size:10').size, 10)
+        self.assertEqual(policy('rss:100').megabytes, 100)
+        never = cache_reset.NeverReset()
+        self.assertIs(policy(never), never)
+        self.assertRaises(ValueError, policy, 'sometimes')
+
+    def test_every(self):
+        policy = cache_reset.EveryNRequests(2)
+        self.assertEqual([policy.should_reset(None) for _ in range(4)],
+                         [False, True, False, True])
+
+    def test_size(self):
+        policy = cache_reset.CacheSizeThreshold(1)
+        self.assertFalse(policy.should_reset(_DB(b'a')))
+        self.assertTrue(policy.should_reset(_DB(b'a', b'b')))
+        self.assertFalse(policy.should_reset(None))
+
+
+class TestStats(unittest.TestCase):
+
+    def test_reloads(self):
+        stats = cache_reset.CacheResetStats()
+        stats.count_reloads = True
+        db = _DB(b'a', b'b')
+        self.assertEqual(stats.record(db, True),
+                         {'reset': True, 'reloaded': None})
+        stats.before_reset(db)
+        db.conns[0]._cache.oids = [b'a', b'c']
+        self.assertEqual(stats.record(db, False),
+                         {'reset': False, 'reloaded': 1})
+        self.assertEqual(stats.record(db, False),
+                         {'reset': False, 'reloaded': None})
+        self.assertEqual(stats.resets, 1)
+        self.assertEqual(stats.reloaded, 1)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import os
+import unittest
+
+from nti.app.testing.forking import ForkedLayerTests
+from nti.app.testing.forking import forked_layer_suite
+
+
+class _BaseLayer(object):
+
+    set_up_pid = None
+    torn_down = False
+
+    @classmethod
+    def setUp(cls):
+        _BaseLayer.set_up_pid = os.getpid()
+
+    @classmethod
+    def tearDown(cls):
+        _BaseLayer.torn_down = True
+
+
+class _Layer(_BaseLayer):
+
+    @classmethod
+    def setUp(cls):
+        pass
+
+    @classmethod
+    def tearDown(cls):
+        pass
+
+
+def _suite():
+    # Not at module scope so that runners don't find it
+
+    class LayerTests(unittest.TestCase):
+
+        layer = _Layer
+
+        def test_success(self):
+            assert _BaseLayer.set_up_pid != os.getpid()
+
+        def test_failure(self):
+            self.fail('Failed')
+
+        def test_error(self):
+            raise ValueError()
+
+        def test_dies(self):
+            os._exit(1)
+
+    return unittest.defaultTestLoader.loadTestsFromTestCase(LayerTests)
+
+
+def _dying_suite():
+
+    class DyingTests(unittest.TestCase):
+
+        layer = _Layer
+
+        def test_a_dies(self):
+            os._exit(1)
+
+        def test_b_dies(self):
+            os._exit(1)
+
+        def test_c_dies(self):
+            os._exit(1)
+
+        def test_d_success(self):
+            pass
+
+        def test_e_sub_tests(self):
+            with self.subTest(i=1):
+                pass
+            with self.subTest(i=2):
+                self.fail('Failed')
+            with self.subTest(i=3):
+                raise ValueError()
+
+    return unittest.defaultTestLoader.loadTestsFromTestCase(DyingTests)
+
+
+class TestForkedLayerTests(unittest.TestCase):
+
+    def setUp(self):
+        _BaseLayer.set_up_pid = None
+        _BaseLayer.torn_down = False
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "Requires fork")
+    def test_forked(self):
+        tests = ForkedLayerTests(_Layer, _suite(), workers=2)
+        result = unittest.TestResult()
+        tests(result)
+
+        self.assertEqual(result.testsRun, 4)
+        self.assertEqual(len(result.failures), 1)
+        # The ValueError and the dead worker
+        self.assertEqual(len(result.errors), 2)
+        self.assertTrue([e for e in result.errors if 'died' in e[1]])
+        self.assertEqual(len(tests.timings), 3)
+        self.assertEqual(_BaseLayer.set_up_pid, os.getpid())
+        self.assertTrue(_BaseLayer.torn_down)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "Requires fork")
+    def test_dead_workers_replaced(self):
+        tests = ForkedLayerTests(_Layer, _dying_suite(), workers=2)
+        result = unittest.TestResult()
+        tests(result)
+
+        self.assertEqual(result.testsRun, 5)
+        # Every worker died at least once, and each test was reported
+        self.assertEqual(len([e for e in result.errors if 'died' in e[1]]), 3)
+        self.assertEqual(len(tests.timings), 2)
+        # The subtests were reported too
+        self.assertEqual(len(result.failures), 1)
+        subtest, message = result.failures[0]
+        self.assertIn('(i=2)', str(subtest))
+        self.assertIn('Failed', message)
+        self.assertTrue([e for e in result.errors if 'ValueError' in e[1]])
+        self.assertFalse(result.wasSuccessful())
+
+    def test_suite_groups_by_layer(self):
+        suite = forked_layer_suite(_suite(), workers=1)
+        tests = list(suite)
+        self.assertEqual(len(tests), 1)
+        self.assertEqual(tests[0].countTestCases(), 4)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
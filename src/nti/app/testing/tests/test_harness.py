@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import unittest
+
+from nti.app.testing.harness import resolve
+from nti.app.testing.harness import layer_test
+from nti.app.testing.harness import layer_chain
+from nti.app.testing.harness import nearest_rank
+from nti.app.testing.harness import layer_set_up
+
+calls = []
+
+
+class _Base(object):
+
+    @classmethod
+    def setUp(cls):
+        calls.append('base.setUp')
+
+    @classmethod
+    def tearDown(cls):
+        calls.append('base.tearDown')
+
+    @classmethod
+    def testSetUp(cls):
+        calls.append('base.testSetUp')
+
+    @classmethod
+    def testTearDown(cls):
+        calls.append('base.testTearDown')
+
+
+class _Mixin(object):
+    pass
+
+
+class _Layer(_Base, _Mixin):
+
+    @classmethod
+    def setUp(cls):
+        calls.append('layer.setUp')
+
+    @classmethod
+    def tearDown(cls):
+        calls.append('layer.tearDown')
+
+    @classmethod
+    def testSetUp(cls):
+        calls.append('layer.testSetUp')
+
+    @classmethod
+    def testTearDown(cls):
+        calls.append('layer.testTearDown')
+
+
+class _Broken(_Base):
+
+    @classmethod
+    def setUp(cls):
+        raise ValueError()
+
+
+class TestLayers(unittest.TestCase):
+
+    def setUp(self):
+        del calls[:]
+
+    def test_layer_chain(self):
+        self.assertEqual(layer_chain(_Layer), [_Base, _Mixin, _Layer])
+
+    def test_set_up_and_test(self):
+        with layer_set_up(_Layer) as layers:
+            with layer_test(layers, self):
+                calls.append('test')
+        self.assertEqual(calls, ['base.setUp', 'layer.setUp',
+                                 'base.testSetUp', 'layer.testSetUp', 'test',
+                                 'layer.testTearDown', 'base.testTearDown',
+                                 'layer.tearDown', 'base.tearDown'])
+
+    def test_failed_set_up(self):
+        with self.assertRaises(ValueError):
+            with layer_set_up(_Broken):
+                self.fail("Not reached")
+        # Only what was set up is torn down
+        self.assertEqual(calls, ['base.setUp', 'base.tearDown'])
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_resolve(self):
+        self.assertIs(resolve('nti.app.testing.harness.resolve'), resolve)
+
+    def test_nearest_rank(self):
+        samples = [5, 1, 4, 2, 3]
+        self.assertEqual(nearest_rank(samples, 50), 3)
+        self.assertEqual(nearest_rank(samples, 100), 5)
+        self.assertEqual(nearest_rank(samples, 0), 1)
+        self.assertEqual(nearest_rank([], 50), 0.0)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -7,8 +7,12 @@ from __future__ import absolute_import
 
 # pylint: disable=protected-access,too-many-public-methods
 
+import os
+import sys
+import json
 import unittest
 import importlib
+import subprocess
 
 
 def _make_import_test(mod_name=None, root='nti.app.testing'):
@@ -27,12 +31,92 @@ class TestModuleImportSideEffects(unittest.TestCase):
     package.
     """
 
-    for mod_name in (None, 'base', 'matchers', 'request_response'):
+    for mod_name in (None, 'base', 'matchers', 'request_response',
+                     'cache_reset', 'redis_client', 'storage', 'zcml',
+                     'forking', 'timing', 'zodb_stats', 'profiling',
+                     'allocations', 'recording', 'replay',
+                     'benchmark', 'trusted_auth'):
         test_name = 'test_' + (mod_name if mod_name else 'root')
         test = _make_import_test(mod_name)
         test.__name__ = test_name
         locals()[test_name] = test
 
 
+_IMPORT_COST_SCRIPT = """
+import sys, time, json
+start = time.time()
+__import__(sys.argv[1])
+print(json.dumps({'time': time.time() - start, 'modules': list(sys.modules)}))
+"""
+
+
+def _import_in_subprocess(mod_name):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+    output = subprocess.check_output([sys.executable, '-c', _IMPORT_COST_SCRIPT,
+                                      mod_name],
+                                     env=env)
+    return json.loads(output.decode('utf-8'))
+
+
+def _make_import_cost_test(mod_name, forbidden, root='nti.app.testing'):
+    def test(self):
+        result = _import_in_subprocess(root + '.' + mod_name)
+        loaded = [m for m in result['modules']
+                  if any(m == f or m.startswith(f + '.') for f in forbidden)]
+        self.assertEqual(loaded, [],
+                         "Importing %s took %.2fs and loaded heavy modules"
+                         % (mod_name, result['time']))
+    return test
+
+
+class TestModuleImportCost(unittest.TestCase):
+    """
+    Importing the lightweight modules of this package must not
+    import the application or the dataserver, and importing the
+    application test support must not create the application or a
+    mock dataserver. Each module is imported in a fresh process.
+    """
+
+    for mod_name, forbidden in (
+            ('matchers', ('nti.dataserver', 'nti.appserver', 'webtest')),
+            ('request_response', ('nti.dataserver', 'nti.appserver', 'webtest')),
+            ('testing', ('nti.dataserver', 'nti.appserver', 'webtest')),
+            ('application_webtest', ('nti.appserver.application',
+                                     'nti.contentlibrary.filesystem',
+                                     'nti.dataserver.tests.mock_dataserver'))):
+        test_name = 'test_import_cost_' + mod_name
+        test = _make_import_cost_test(mod_name, forbidden)
+        test.__name__ = test_name
+        locals()[test_name] = test
+
+    del mod_name, forbidden, test_name, test
+
+
+_WEBTEST_PATCHES_SCRIPT = """
+import sys
+import nti.app.testing.testing as testing
+assert 'webtest' not in sys.modules
+import webtest.lint
+# Nothing is patched behind our back
+assert webtest.lint.check_headers is not testing.unicode_check_headers
+testing.patch_webtest()
+assert webtest.lint.check_headers is testing.unicode_check_headers
+import webtest.forms
+assert webtest.forms.Field.value is None
+"""
+
+
+class TestWebtestPatches(unittest.TestCase):
+
+    def test_patched_when_asked(self):
+        # Importing the testing module doesn't pay for webtest,
+        # or patch it; test apps apply the patches when created.
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+        subprocess.check_call([sys.executable, '-c', _WEBTEST_PATCHES_SCRIPT],
+                              env=env)
+
+
 def test_suite():
     return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import unittest
+
+import zope.testing.cleanup
+
+from zope import component
+
+from pyramid.interfaces import ISettings
+
+from nti.app.testing import layers
+
+
+class _Layer(object):
+    pass
+
+
+class TestDeferredTearDown(unittest.TestCase):
+
+    def setUp(self):
+        self.torn_down = []
+        self.settings = {'k': 'v'}
+        component.provideUtility(self.settings, ISettings)
+
+    def tearDown(self):
+        layers.finish_deferred_tear_down()
+        zope.testing.cleanup.cleanUp()
+
+    def _defer(self, key='key'):
+        layers.defer_tear_down(_Layer, key,
+                               lambda: self.torn_down.append(_Layer))
+
+    def test_same_key_reuses(self):
+        self._defer()
+        self.assertIs(layers.take_deferred_layer('key'), _Layer)
+        self.assertEqual(self.torn_down, [])
+        # Only once
+        self.assertIsNone(layers.take_deferred_layer('key'))
+
+    def test_different_key_tears_down(self):
+        self._defer()
+        self.assertIsNone(layers.take_deferred_layer('other'))
+        layers.finish_deferred_tear_down()
+        self.assertEqual(self.torn_down, [_Layer])
+        self.assertIsNone(layers.take_deferred_layer('key'))
+
+    def test_changed_settings_tear_down(self):
+        self._defer()
+        component.provideUtility({'k': 'other'}, ISettings)
+        self.assertIsNone(layers.take_deferred_layer('key'))
+        self.assertEqual(self.torn_down, [_Layer])
+
+    def test_clean_up_tears_down(self):
+        # As when another kind of layer is set up
+        self._defer()
+        zope.testing.cleanup.cleanUp()
+        self.assertEqual(self.torn_down, [_Layer])
+        self.assertIsNone(layers.take_deferred_layer('key'))
+
+    def test_deferring_again_tears_down(self):
+        self._defer()
+        self._defer('other')
+        self.assertEqual(self.torn_down, [_Layer])
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import shutil
+import pstats
+import os.path
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+from pyramid.config import Configurator
+
+from pyramid.request import Request
+
+from pyramid.response import Response
+
+from nti.app.testing import profiling
+
+
+class _Context(object):
+    pass
+
+
+def _app(environ, start_response):
+    start_response('200 OK', [])
+    return [b'']
+
+
+def _view(request):
+    return Response(b'')
+
+
+def _pyramid_app():
+    config = Configurator(root_factory=lambda request: _Context())
+    config.add_route('user', '/users/{name}')
+    config.add_view(_view, route_name='user')
+    config.add_view(_view, context=_Context, name='Activity')
+    app = config.make_wsgi_app()
+    profiling.watch_endpoints(app.registry)
+    profiling.watch_endpoints(app.registry)
+    return app
+
+
+class TestProfiling(unittest.TestCase):
+
+    def test_endpoint_key(self):
+        key = profiling.endpoint_key
+        self.assertEqual(key({'REQUEST_METHOD': 'PUT',
+                              'PATH_INFO': '/dataserver2/users/sjohnson@nextthought.com/Pages(tag:nti:foo)/x'}),
+                         'PUT /dataserver2/users/*/*/x')
+        self.assertEqual(key({'PATH_INFO': '/a/12/b'}), 'GET /a/*/b')
+        self.assertEqual(key({'PATH_INFO': '/dataserver2/users/sjohnson/@@Activity'}),
+                         'GET /dataserver2/users/*/@@Activity')
+        self.assertEqual(key({'PATH_INFO': '/dataserver2/Objects/0x1a2b/@@edit'}),
+                         'GET /dataserver2/Objects/*/@@edit')
+
+    def test_endpoint_key_from_pyramid(self):
+        app = _pyramid_app()
+        keys = []
+        for path in '/users/sjohnson', '/Activity':
+            environ = Request.blank(path).environ
+            app(environ, lambda *args: None)
+            keys.append(profiling.endpoint_key(environ))
+        self.assertEqual(keys, ['GET /users/{name}', 'GET _Context@@Activity'])
+
+    def test_file_names_differ(self):
+        names = set(profiling._file_name(k) for k in ('GET /a/*', 'GET /a'))
+        self.assertEqual(len(names), 2)
+        self.assertTrue(profiling._file_name('GET /a').startswith('GET_a-'))
+
+    def test_profile_and_write(self):
+        profiles = profiling.RequestProfiles()
+        for _ in range(2):
+            profiles.profile(_app, {'PATH_INFO': '/a/1'}, lambda *args: None)
+        self.assertEqual(list(profiles.stats), ['GET /a/*'])
+
+        directory = tempfile.mkdtemp()
+        try:
+            paths = profiles.write(directory)
+            self.assertEqual([os.path.basename(p) for p in paths],
+                             [profiling._file_name('GET /a/*')])
+            stats = pstats.Stats(paths[0])
+            self.assertTrue(any(func[2] == '_app' and stat[1] == 2
+                                for func, stat in stats.stats.items()))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_profiles_for(self):
+        with mock.patch.dict('os.environ', {profiling.PROFILE_DIR_ENV: '/env'}), \
+             mock.patch.object(profiling, '_directory_profiles', {}):
+            self.assertIs(profiling.profiles_for(), profiling.request_profiles)
+            self.assertIs(profiling.profiles_for('/env'),
+                          profiling.request_profiles)
+            profiles = profiling.profiles_for('/a')
+            self.assertEqual(profiles.directory, '/a')
+            self.assertIs(profiling.profiles_for('/a'), profiles)
+            self.assertIsNot(profiling.profiles_for('/b'), profiles)
+            # The process-wide profiles are left alone
+            self.assertIsNone(profiling.request_profiles.directory)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
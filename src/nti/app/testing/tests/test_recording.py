@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import shutil
+import os.path
+import tempfile
+import unittest
+
+from nti.app.testing import recording
+
+
+class TestRecording(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _check_round_trip(self, name):
+        path = os.path.join(self.directory, name)
+        recorder = recording.TrafficRecorder(path)
+        self.assertTrue(recorder.enabled)
+        first, second = recorder.new_session(), recorder.new_session()
+        environ = recording.recorded_environ({'HTTP_ACCEPT': 'text/plain',
+                                              'CONTENT_TYPE': 'text/plain',
+                                              'wsgi.input': None})
+        recorder.record(first, 'POST', '/a?b=c', environ, b'{"a": 1}', 201)
+        recorder.record(second, 'GET', '/b', {}, b'', 200)
+        recorder.record(first, 'PUT', '/a', {}, b'\xff\x00', 204)
+
+        records = recording.read_recording(path)
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['environ'],
+                         {'HTTP_ACCEPT': 'text/plain',
+                          'CONTENT_TYPE': 'text/plain'})
+        self.assertEqual(recording.decode_body(records[0]), b'{"a": 1}')
+        self.assertEqual(recording.decode_body(records[1]), b'')
+        self.assertEqual(recording.decode_body(records[2]), b'\xff\x00')
+
+        grouped = recording.sessions(records)
+        self.assertEqual([[r['method'] for r in s] for s in grouped],
+                         [['POST', 'PUT'], ['GET']])
+
+    def test_round_trip(self):
+        self._check_round_trip('traffic.jsonl')
+
+    def test_round_trip_compressed(self):
+        self._check_round_trip('traffic.jsonl.gz')
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import os
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+import fakeredis
+
+from zope import component
+from zope import interface
+
+from zope.testing.cleanup import cleanUp
+
+from nti.dataserver.interfaces import IRedisClient
+
+from nti.app.testing.redis_client import reset_redis
+from nti.app.testing.redis_client import REDIS_ISOLATION_ENV
+from nti.app.testing.redis_client import redis_snapshot
+from nti.app.testing.redis_client import count_redis_calls
+from nti.app.testing.redis_client import redis_registrations
+from nti.app.testing.redis_client import stop_counting_redis_calls
+
+
+class IOtherRedis(interface.Interface):
+    pass
+
+
+class _Dataserver(object):
+
+    def __init__(self, redis):
+        self.redis = redis
+
+
+class TestReplaceRedis(unittest.TestCase):
+
+    def setUp(self):
+        cleanUp()
+        self.client = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+        self.ds = _Dataserver(self.client)
+        gsm = component.getGlobalSiteManager()
+        gsm.registerUtility(self.client, IRedisClient)
+        gsm.registerUtility(self.client, IRedisClient, name=u'named')
+        gsm.registerUtility(self.client, IOtherRedis)
+
+    def tearDown(self):
+        cleanUp()
+
+    def _registered(self):
+        return [component.getUtility(IRedisClient),
+                component.getUtility(IRedisClient, name=u'named'),
+                component.getUtility(IOtherRedis)]
+
+    def test_counting_replaces_every_registration(self):
+        counting = count_redis_calls(self.ds)
+        self.assertIsNot(counting, self.client)
+        self.assertEqual(self._registered(), [counting] * 3)
+        # Adaptation and lookups by interface still find it
+        self.assertTrue(IRedisClient.providedBy(counting))
+
+        component.getUtility(IRedisClient, name=u'named').set('a', '1')
+        self.assertEqual(counting.calls['set'], 1)
+
+        stop_counting_redis_calls(self.ds)
+        self.assertIs(self.ds.redis, self.client)
+        self.assertEqual(self._registered(), [self.client] * 3)
+
+    def test_only_recorded_registrations_replaced(self):
+        registrations = redis_registrations(self.client)
+        self.assertEqual(sorted((p.__name__, n) for p, n, _ in registrations),
+                         [('IOtherRedis', u''), ('IRedisClient', u''),
+                          ('IRedisClient', u'named')])
+        unnamed = [r for r in registrations if r[:2] == (IRedisClient, u'')]
+        with mock.patch.object(component.getGlobalSiteManager(),
+                               'registeredUtilities') as registered:
+            counting = count_redis_calls(self.ds, unnamed)
+        # What was recorded is used; nothing else is looked at
+        registered.assert_not_called()
+        self.assertEqual(self._registered(),
+                         [counting, self.client, self.client])
+
+    def test_isolated_client_everywhere(self):
+        self.client.set('stale', '1')
+        self.client.set('kept', '1')
+        snapshot = [s for s in redis_snapshot(self.client) if s[0] == b'kept']
+        with mock.patch.dict(os.environ, {REDIS_ISOLATION_ENV: '1'}):
+            reset_redis(self.ds, snapshot)
+        self.assertIsNot(self.ds.redis, self.client)
+        for client in self._registered():
+            self.assertIs(client, self.ds.redis)
+        self.assertEqual(self.ds.redis.keys('*'), [b'kept'])
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
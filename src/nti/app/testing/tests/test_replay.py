@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import unittest
+
+from nti.app.testing.replay import Measurements
+
+from nti.app.testing.zodb_stats import ZODB_STATS_KEY
+
+
+class _Stats(object):
+    loads = 3
+    cleared = False
+
+
+class TestMeasurements(unittest.TestCase):
+
+    def test_measured_by_middleware(self):
+        def app(environ, start_response):
+            environ[ZODB_STATS_KEY] = _Stats()
+            start_response('200 OK', [])
+            return [b'']
+
+        measurements = Measurements()
+        wrapped = measurements.middleware(app)
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/a'}
+        wrapped(environ, lambda *args: None)
+
+        self.assertEqual(measurements.requests, 1)
+        self.assertEqual(measurements.loads, [3])
+        self.assertEqual(len(measurements.latencies), 1)
+        self.assertEqual(measurements.report()['requests'], 1)
+
+    def test_cleared_loads_left_out(self):
+        stats = _Stats()
+        stats.cleared = True
+        measurements = Measurements()
+        measurements.record({'PATH_INFO': '/a'}, 0.1, stats)
+        self.assertEqual(measurements.loads, [])
+        self.assertEqual(measurements.report()['zodb_cleared_requests'], 1)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
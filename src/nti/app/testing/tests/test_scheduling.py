@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import unittest
+
+from nti.app.testing.scheduling import layer_group
+from nti.app.testing.scheduling import order_layers
+
+
+class _Layer(object):
+    features = ()
+    APP_IN_DEVMODE = True
+
+
+class _DevmodeA(_Layer):
+    pass
+
+
+class _DevmodeB(_Layer):
+    pass
+
+
+class _Production(_Layer):
+    APP_IN_DEVMODE = False
+
+
+class _Featured(_Layer):
+    features = ('b', 'a')
+
+
+class _Settings(_Layer):
+
+    @classmethod
+    def _extra_app_settings(cls):
+        return {'key': 'value'}
+
+
+class _BrokenSettings(_Layer):
+
+    @classmethod
+    def _extra_app_settings(cls):
+        raise ValueError()
+
+
+class TestLayerGroup(unittest.TestCase):
+
+    def test_same_configuration(self):
+        self.assertEqual(layer_group(_DevmodeA), layer_group(_DevmodeB))
+        self.assertEqual(layer_group(_DevmodeA), layer_group(_BrokenSettings))
+
+        class Reordered(_Layer):
+            features = ('a', 'b')
+        self.assertEqual(layer_group(_Featured), layer_group(Reordered))
+
+    def test_different_configuration(self):
+        groups = set(layer_group(l)
+                     for l in (_DevmodeA, _Production, _Featured, _Settings))
+        self.assertEqual(len(groups), 4)
+
+    def test_not_an_application_layer(self):
+        self.assertEqual(layer_group(object), layer_group(object))
+
+
+class TestOrderLayers(unittest.TestCase):
+
+    def test_groups_together_cheapest_first(self):
+        costs = {_DevmodeA: 5, _DevmodeB: 1, _Production: 3, _Featured: 10}
+        ordered = order_layers([_DevmodeA, _Production, _Featured, _DevmodeB],
+                               costs.get)
+        self.assertEqual(ordered,
+                         [_Production,
+                          # Cheapest within the group first
+                          _DevmodeB, _DevmodeA,
+                          _Featured])
+
+    def test_ties_broken_by_name(self):
+        ordered = order_layers([_DevmodeB, _Production, _DevmodeA],
+                               lambda unused_layer: 0)
+        self.assertEqual(ordered, [_DevmodeA, _DevmodeB, _Production])
+
+    def test_empty(self):
+        self.assertEqual(order_layers([], lambda unused_layer: 0), [])
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
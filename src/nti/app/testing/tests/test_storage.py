@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import shutil
+import tempfile
+import unittest
+
+import transaction
+
+from persistent.mapping import PersistentMapping
+
+from ZODB.DB import DB
+
+from ZODB.DemoStorage import DemoStorage
+
+from nti.app.testing.storage import stack_changes
+from nti.app.testing.storage import snapshot_fingerprint
+from nti.app.testing.storage import save_storage_snapshot
+from nti.app.testing.storage import load_storage_snapshot
+
+
+def _populated_storage():
+    storage = DemoStorage()
+    db = DB(storage)
+    conn = db.open()
+    conn.root()['a'] = PersistentMapping()
+    transaction.commit()
+    conn.root()['a']['b'] = 1
+    transaction.commit()
+    conn.close()
+    return storage
+
+
+class TestSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fingerprint_depends_on_arguments(self):
+        self.assertEqual(snapshot_fingerprint(('a', 'b'), True, {}),
+                         snapshot_fingerprint(('b', 'a'), True, {}))
+        self.assertNotEqual(snapshot_fingerprint((), True, {}),
+                            snapshot_fingerprint((), False, {}))
+        self.assertNotEqual(snapshot_fingerprint((), True, {}),
+                            snapshot_fingerprint((), True, {'k': 1}))
+
+    def test_round_trip(self):
+        self.assertIsNone(load_storage_snapshot('fp', self.directory))
+
+        path = save_storage_snapshot(_populated_storage(), 'fp', self.directory)
+        self.assertIsNotNone(path)
+
+        storage = load_storage_snapshot('fp', self.directory)
+        conn = DB(storage).open()
+        self.assertEqual(dict(conn.root()['a']), {'b': 1})
+        conn.close()
+
+
+class TestStackChanges(unittest.TestCase):
+
+    def test_later_tests_see_the_same_users(self):
+        base = _populated_storage()
+        # The first test creates the users, changing existing objects
+        first = DB(DemoStorage(base=base, close_base_on_close=False))
+        conn = first.open()
+        conn.root()['a']['users'] = PersistentMapping({'jason': 1})
+        conn.root()['users'] = PersistentMapping({'sjohnson': 2})
+        transaction.commit()
+        conn.close()
+        fixture = stack_changes(first.storage, base)
+        first.close()
+
+        for _ in range(2):
+            # Each later test sees them, and its changes are its own
+            db = DB(DemoStorage(base=fixture, close_base_on_close=False))
+            conn = db.open()
+            root = conn.root()
+            self.assertEqual(dict(root['users']), {'sjohnson': 2})
+            self.assertEqual(dict(root['a']['users']), {'jason': 1})
+            root['users']['other'] = 3
+            transaction.commit()
+            conn.close()
+            db.close()
+        self.assertTrue(base.opened())
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
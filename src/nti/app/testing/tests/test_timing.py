@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import json
+import shutil
+import os.path
+import tempfile
+import unittest
+
+from nti.app.testing import timing
+
+
+class TestTiming(unittest.TestCase):
+
+    def setUp(self):
+        timing.clear_phase_timings()
+
+    tearDown = setUp
+
+    def test_timed_phase(self):
+        with timing.timed_phase(TestTiming, 'phase'):
+            pass
+        timings = timing.phase_timings()
+        self.assertEqual(len(timings), 1)
+        self.assertEqual(timings[0].layer, __name__ + '.TestTiming')
+        self.assertEqual(timings[0].phase, 'phase')
+        self.assertGreaterEqual(timings[0].wall, 0)
+
+    def test_failed_phase_not_recorded(self):
+        with self.assertRaises(ValueError):
+            with timing.timed_phase(TestTiming, 'phase'):
+                raise ValueError()
+        self.assertEqual(timing.phase_timings(), [])
+
+    def test_report(self):
+        for _ in range(2):
+            with timing.timed_phase(TestTiming, 'phase'):
+                pass
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'timings.json')
+            timing.write_timing_report(path)
+            with open(path) as f:
+                report = json.load(f)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(len(report['phases']), 2)
+        self.assertEqual(list(report['layers']), [__name__ + '.TestTiming'])
+
+
+class TestRSS(unittest.TestCase):
+
+    def test_rss(self):
+        peak = timing.peak_rss()
+        current = timing.current_rss()
+        if peak is None:  # pragma: no cover
+            return
+        self.assertGreater(current, 0)
+        # Allow for the pages counted differently, and for growth
+        # between the two calls
+        self.assertLessEqual(current, timing.peak_rss() * 2)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import unittest
+
+from repoze.who.api import APIFactory
+
+from repoze.who.interfaces import IIdentifier
+from repoze.who.interfaces import IAuthenticator
+
+from zope.interface.verify import verifyObject
+
+from nti.app.testing import trusted_auth
+
+
+class TestTrustedPrincipals(unittest.TestCase):
+
+    def _authenticated(self, authorization, userid):
+        return {
+            'HTTP_AUTHORIZATION': authorization,
+            trusted_auth.IDENTITY_KEY: {trusted_auth.USERID_KEY: userid},
+        }
+
+    def test_trust_after_authentication(self):
+        principals = trusted_auth.TrustedPrincipals()
+        environ = {'HTTP_AUTHORIZATION': 'Basic abc'}
+        self.assertFalse(principals.trust(environ))
+
+        principals.learn(self._authenticated('Basic abc', 'sjohnson'))
+        self.assertTrue(principals.trust(environ))
+        identity = environ[trusted_auth.IDENTITY_KEY]
+        self.assertEqual(identity[trusted_auth.USERID_KEY], 'sjohnson')
+        self.assertIs(identity['identifier'], trusted_auth.trusted_identifier)
+        self.assertEqual(identity['identifier'].remember(environ, identity), [])
+
+        # Other credentials still authenticate
+        self.assertFalse(principals.trust({'HTTP_AUTHORIZATION': 'Basic xyz'}))
+
+        principals.clear()
+        self.assertFalse(principals.trust({'HTTP_AUTHORIZATION': 'Basic abc'}))
+
+    def test_rejected_credentials_not_learned(self):
+        principals = trusted_auth.TrustedPrincipals()
+        principals.learn({'HTTP_AUTHORIZATION': 'Basic abc',
+                          trusted_auth.IDENTITY_KEY: None})
+        self.assertFalse(principals.trust({'HTTP_AUTHORIZATION': 'Basic abc'}))
+
+
+class TestWhoPlugin(unittest.TestCase):
+
+    def test_provides_plugin_interfaces(self):
+        verifyObject(IIdentifier, trusted_auth.trusted_identifier)
+        verifyObject(IAuthenticator, trusted_auth.trusted_identifier)
+
+    def test_registered_plugin_authenticates(self):
+        principals = trusted_auth.TrustedPrincipals()
+        principals.learn({
+            'HTTP_AUTHORIZATION': 'Basic abc',
+            trusted_auth.IDENTITY_KEY: {trusted_auth.USERID_KEY: 'sjohnson'},
+        })
+        environ = {'HTTP_AUTHORIZATION': 'Basic abc',
+                   'REQUEST_METHOD': 'GET'}
+        self.assertTrue(principals.trust(environ))
+        plugins = [('trusted', trusted_auth.trusted_identifier)]
+        api = APIFactory(identifiers=plugins, authenticators=plugins,
+                         challengers=(), mdproviders=())(environ)
+        identity = api.authenticate()
+        self.assertEqual(identity[trusted_auth.USERID_KEY], 'sjohnson')
+        self.assertIs(identity['identifier'], trusted_auth.trusted_identifier)
+        self.assertEqual(environ['REMOTE_USER'], 'sjohnson')
+
+    def test_bypasses_unregistered_api(self):
+        # Without the plugin, the who API itself doesn't trust the
+        # identity put in the environment; only policies that look
+        # there first do.
+        environ = {'HTTP_AUTHORIZATION': 'Basic abc',
+                   'REQUEST_METHOD': 'GET',
+                   trusted_auth.TRUSTED_PRINCIPAL_KEY: 'sjohnson'}
+        environ[trusted_auth.IDENTITY_KEY] = \
+            trusted_auth.trusted_identifier.identify(environ)
+        api = APIFactory(identifiers=(), authenticators=(),
+                         challengers=(), mdproviders=())(environ)
+        self.assertIsNone(api.authenticate())
+        self.assertNotIn('REMOTE_USER', environ)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
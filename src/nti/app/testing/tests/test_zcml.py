@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import os
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+from zope import component
+from zope import interface
+
+from zope.configuration import xmlconfig
+
+from zope.configuration.config import ConfigurationMachine
+
+from zope.testing.cleanup import cleanUp
+
+from nti.app.testing.zcml import cached_actions
+from nti.app.testing.zcml import ZCMLActionCache
+
+
+class IThing(interface.Interface):
+    pass
+
+
+@interface.implementer(IThing)
+class Thing(object):
+    pass
+
+
+_INCLUDED = """
+<configure xmlns="http://namespaces.zope.org/zope">
+  <include package="zope.component" file="meta.zcml" />
+  <utility factory="%(module)s.Thing" provides="%(module)s.IThing" />
+  <utility factory="%(module)s.Thing" provides="%(module)s.IThing"
+           name="named" />
+</configure>
+""" % {'module': __name__}
+
+_TOP = """
+<configure xmlns="http://namespaces.zope.org/zope">
+  <include file="%s" />
+  <utility factory="%s.Thing" provides="%s.IThing" name="top" />
+</configure>
+"""
+
+
+def _registrations():
+    return sorted((reg.provided.__identifier__, reg.name, type(reg.component))
+                  for reg in component.getGlobalSiteManager().registeredUtilities()
+                  if reg.provided is IThing)
+
+
+@contextlib.contextmanager
+def _parsed_files():
+    parsed = []
+    processxmlfile = xmlconfig.processxmlfile
+
+    def record(f, context, *args, **kwargs):
+        parsed.append(getattr(f, 'name', None))
+        return processxmlfile(f, context, *args, **kwargs)
+    with mock.patch.object(xmlconfig, 'processxmlfile', record):
+        yield parsed
+
+
+class TestZCMLActionCache(unittest.TestCase):
+
+    def setUp(self):
+        cleanUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'configure.zcml')
+        with open(self.path, 'w') as f:
+            f.write(_INCLUDED)
+        self.top = _TOP % (self.path, __name__, __name__)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        cleanUp()
+
+    def test_replay_matches_fresh_configuration(self):
+        machine = dict(ConfigurationMachine.__dict__)
+        xmlconfig.string(self.top)
+        fresh = _registrations()
+        self.assertEqual(len(fresh), 3)
+
+        cache = ZCMLActionCache()
+        parsed_files = []
+        for _ in range(3):
+            cleanUp()
+            with _parsed_files() as parsed, cache.configuring('key'):
+                xmlconfig.string(self.top)
+            parsed_files.append(parsed)
+            self.assertEqual(_registrations(), fresh)
+        # Parsed once, then replayed: no included file is even opened
+        # again, only the string we give it is parsed
+        self.assertEqual(parsed_files[0][:2], ['<string>', self.path])
+        self.assertIn('meta.zcml', os.path.basename(parsed_files[0][2]))
+        self.assertEqual(parsed_files[1:], [['<string>'], ['<string>']])
+        self.assertEqual([parsed for parsed, _ in cache.timings['key']],
+                         [True, False, False])
+        # And the machine is left alone afterwards
+        self.assertEqual(dict(ConfigurationMachine.__dict__), machine)
+
+    def test_changed_file_is_parsed_again(self):
+        cache = ZCMLActionCache()
+        with cache.configuring('key'):
+            xmlconfig.string(self.top)
+        cleanUp()
+        with open(self.path, 'w') as f:
+            f.write(_INCLUDED.replace('name="named"', 'name="renamed"'))
+        with _parsed_files() as parsed, cache.configuring('key'):
+            xmlconfig.string(self.top)
+        self.assertIn(self.path, parsed)
+        self.assertIn((IThing.__identifier__, u'renamed', Thing),
+                      _registrations())
+        self.assertEqual([parsed for parsed, _ in cache.timings['key']],
+                         [True, True])
+
+    def test_not_enabled(self):
+        process_file = ConfigurationMachine.processFile
+        with cached_actions('key', enabled=False):
+            self.assertIs(ConfigurationMachine.processFile, process_file)
+            xmlconfig.string(self.top)
+        self.assertEqual(len(_registrations()), 3)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+import transaction
+
+from persistent.mapping import PersistentMapping
+
+from ZODB.DB import DB
+
+from ZODB.DemoStorage import DemoStorage
+
+from nti.app.testing.matchers import loads_at_most
+
+from nti.app.testing.zodb_stats import measure_request
+from nti.app.testing.zodb_stats import transfer_counts
+from nti.app.testing.zodb_stats import connection_transfer_counts
+
+
+class TestTransferCounts(unittest.TestCase):
+
+    def setUp(self):
+        self.db = DB(DemoStorage())
+        conn = self.db.open()
+        conn.root()['a'] = PersistentMapping({'b': 1})
+        transaction.commit()
+        conn.close()
+
+    def tearDown(self):
+        transaction.abort()
+        self.db.close()
+
+    def _load_in_new_connection(self):
+        conn = self.db.open()
+        # So the objects are loaded from the storage
+        conn.cacheMinimize()
+        dict(conn.root()['a'])
+        return conn
+
+    def test_new_connections_count_from_zero(self):
+        pooled = self.db.open()
+        before = connection_transfer_counts(self.db)
+        conn = self._load_in_new_connection()
+        conn.root()['a']['c'] = 2
+        transaction.commit()
+        loads, stores = transfer_counts(self.db, before)
+        # The root and the mapping, and the changed mapping, all in
+        # the connection that wasn't there before
+        self.assertEqual((loads, stores), (2, 1))
+        conn.close()
+        pooled.close()
+
+    def test_cleared_counts_are_not_negative(self):
+        conn = self._load_in_new_connection()
+        before = connection_transfer_counts(self.db)
+        self.assertEqual(before[conn][0], 2)
+        conn.getTransferCounts(clear=True)
+        self.assertEqual(transfer_counts(self.db, before), (0, 0))
+        # Only what happens after that counts
+        conn.root()['a']['c'] = 2
+        transaction.commit()
+        self.assertEqual(transfer_counts(self.db, before), (0, 1))
+        self.assertEqual(transfer_counts(self.db), (0, 1))
+        conn.close()
+
+    def test_measure_request_cleared(self):
+        def app(environ, start_response):
+            conn = self._load_in_new_connection()
+            conn.getTransferCounts(clear=True)
+            conn.close()
+            return [b'']
+
+        conn = self._load_in_new_connection()
+        conn.close()
+        _, stats = measure_request(self.db, app, {}, None)
+        self.assertTrue(stats.cleared)
+        self.assertFalse(loads_at_most(10).matches(mock.Mock(zodb_stats=stats)))
+
+    def test_measure_request(self):
+        def app(environ, start_response):
+            conn = self._load_in_new_connection()
+            conn.root()['a']['c'] = 2
+            transaction.commit()
+            conn.close()
+            start_response('200 OK', [])
+            return [b'']
+
+        result, stats = measure_request(self.db, app, {},
+                                        lambda *args: None)
+        self.assertEqual(result, [b''])
+        self.assertEqual((stats.loads, stats.stores, stats.commits),
+                         (2, 1, 1))
+        self.assertFalse(stats.cleared)
+        self.assertTrue(loads_at_most(2).matches(mock.Mock(zodb_stats=stats)))
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Timing of the phases of layer set up and tear down.
+
+The layers in this package record how long each expensive phase of
+their set up and tear down takes using :func:`timed_phase`. For each
+phase, the wall clock time, CPU time and growth in the peak resident
+set size of the process are kept.
+
+If the environment variable named by :data:`LAYER_TIMINGS_ENV` is set,
+a JSON report of all the phases is written to the file it names when
+the process exits.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import os
+import sys
+import json
+import time
+import atexit
+import contextlib
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+__test__ = False
+
+#: The name of an environment variable. If it is set, it names a
+#: file that a JSON report of layer phase timings is written to
+#: when the process exits.
+LAYER_TIMINGS_ENV = 'NTI_APP_TESTING_LAYER_TIMINGS'
+
+logger = __import__('logging').getLogger(__name__)
+
+try:
+    _cpu_time = time.process_time
+except AttributeError:  # pragma: no cover
+    # Python 2
+    _cpu_time = time.clock
+
+
+def peak_rss():
+    """
+    The peak resident set size of this process, in bytes, or None
+    if it can't be determined.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss():
+    """
+    The resident set size of this process, in bytes. Where that
+    can't be found, :func:`peak_rss` is used instead.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        return peak_rss()
+
+
+def layer_name(layer):
+    return '%s.%s' % (getattr(layer, '__module__', '?'),
+                      getattr(layer, '__name__', layer))
+
+
+class PhaseTiming(object):
+    """
+    The measurements of one phase of one layer.
+    """
+
+    def __init__(self, layer, phase, wall, cpu, peak_rss_delta):
+        self.layer = layer
+        self.phase = phase
+        self.wall = wall
+        self.cpu = cpu
+        self.peak_rss_delta = peak_rss_delta
+
+    def to_dict(self):
+        return {
+            'layer': self.layer,
+            'phase': self.phase,
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'peak_rss_delta': self.peak_rss_delta,
+        }
+
+    def __repr__(self):
+        return '<%s %s %s wall=%.3fs cpu=%.3fs>' % (type(self).__name__,
+                                                   self.layer, self.phase,
+                                                   self.wall, self.cpu)
+
+
+#: All the phase timings recorded in this process, in order.
+_timings = []
+
+
+def phase_timings():
+    """
+    Return a list of all the :class:`PhaseTiming` objects recorded.
+    """
+    return list(_timings)
+
+
+def clear_phase_timings():
+    del _timings[:]
+
+
+@contextlib.contextmanager
+def timed_phase(layer, phase):
+    """
+    Record the time taken by the body as the *phase* of *layer*.
+
+    Phases that raise an exception are not recorded.
+    """
+    rss = peak_rss()
+    cpu = _cpu_time()
+    wall = time.time()
+    yield
+    wall = time.time() - wall
+    cpu = _cpu_time() - cpu
+    if rss is not None:
+        rss = peak_rss() - rss
+    _timings.append(PhaseTiming(layer_name(layer), phase, wall, cpu, rss))
+
+
+def timing_report():
+    """
+    Return a dictionary suitable for serializing as JSON holding each
+    recorded phase, plus the totals for each layer.
+    """
+    layers = {}
+    for timing in _timings:
+        totals = layers.setdefault(timing.layer, {'wall': 0.0, 'cpu': 0.0})
+        totals['wall'] += timing.wall
+        totals['cpu'] += timing.cpu
+    return {
+        'phases': [t.to_dict() for t in _timings],
+        'layers': layers,
+    }
+
+
+def write_timing_report(path):
+    with open(path, 'w') as f:
+        json.dump(timing_report(), f, indent=2, sort_keys=True)
+
+
+def _write_report_at_exit():
+    path = os.environ.get(LAYER_TIMINGS_ENV)
+    if path and _timings:
+        try:
+            write_timing_report(path)
+        except (IOError, OSError):  # pragma: no cover
+            logger.exception("Failed to write layer timings to %s", path)
+
+atexit.register(_write_report_at_exit)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Skipping authentication in functional tests that aren't about it.
+
+Every request made with Basic credentials goes through repoze.who: the
+header is decoded, the user is looked up and the password compared.
+When trusted authentication is enabled, the pipeline built by
+:func:`nti.app.testing.webtest.TestApp` lets the first request with a
+given ``Authorization`` header take that path, and remembers the user
+id it authenticated. Later requests with the same header are identified
+by :class:`TrustedPrincipalIdentifier` instead: the identity is put
+in the environment before the application sees the request. Credentials
+that were rejected are never trusted.
+
+Note that this *bypasses* the repoze.who plugins of the application
+rather than being one of them: the authentication policy
+(``pyramid_who``'s, which the application uses) takes an identity it
+finds in the environment as already authenticated and doesn't call
+repoze.who at all. Code that calls the repoze.who API itself, such as
+the repoze.who middleware, ignores that identity and authenticates the
+request as usual, unless :data:`trusted_identifier` is also registered
+with it, as both an identifier and an authenticator.
+
+Enable it by setting the environment variable named by
+:data:`TRUSTED_AUTH_ENV`, or by passing ``trusted_auth=True`` to
+``TestApp`` (or to ``WithSharedApplicationMockDS``). Tests of
+authentication itself should pass ``trusted_auth=False``.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import os
+
+from repoze.who.interfaces import IIdentifier
+from repoze.who.interfaces import IAuthenticator
+
+from zope import interface
+
+__test__ = False
+
+#: The name of an environment variable. If it is set to a non-empty
+#: value, test apps trust the credentials that authenticated once.
+TRUSTED_AUTH_ENV = 'NTI_APP_TESTING_TRUSTED_AUTH'
+
+#: The key in the WSGI environment of a request under which the
+#: user id of a trusted principal is found.
+TRUSTED_PRINCIPAL_KEY = 'nti.app.testing.trusted_principal'
+
+#: Where repoze.who keeps the identity it authenticated
+IDENTITY_KEY = 'repoze.who.identity'
+USERID_KEY = 'repoze.who.userid'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def trusted_auth_enabled():
+    return bool(os.environ.get(TRUSTED_AUTH_ENV))
+
+
+@interface.implementer(IIdentifier, IAuthenticator)
+class TrustedPrincipalIdentifier(object):
+    """
+    A repoze.who ``IIdentifier`` and ``IAuthenticator`` plugin that
+    identifies, and authenticates, the user named in the environment
+    under :data:`TRUSTED_PRINCIPAL_KEY`, and never sets or clears any
+    headers.
+    """
+
+    def identify(self, environ):
+        userid = environ.get(TRUSTED_PRINCIPAL_KEY)
+        if not userid:
+            return None
+        return {
+            TRUSTED_PRINCIPAL_KEY: userid,
+            USERID_KEY: userid,
+            'identifier': self,
+        }
+
+    def authenticate(self, unused_environ, identity):
+        return identity.get(TRUSTED_PRINCIPAL_KEY)
+
+    def remember(self, unused_environ, unused_identity):
+        return []
+
+    def forget(self, unused_environ, unused_identity):
+        return []
+
+
+trusted_identifier = TrustedPrincipalIdentifier()
+
+
+class TrustedPrincipals(object):
+    """
+    Remembers the user id that the real authentication path found
+    for each ``Authorization`` header, and identifies later
+    requests with that header as that user.
+    """
+
+    def __init__(self, identifier=trusted_identifier):
+        self.identifier = identifier
+        self._userids = {}
+
+    def trust(self, environ):
+        """
+        If the credentials of the request in *environ* authenticated
+        before, identify it as that user and return true.
+        """
+        userid = self._userids.get(environ.get('HTTP_AUTHORIZATION'))
+        if not userid or IDENTITY_KEY in environ:
+            return False
+        environ[TRUSTED_PRINCIPAL_KEY] = userid
+        environ[IDENTITY_KEY] = self.identifier.identify(environ)
+        return True
+
+    def learn(self, environ):
+        """
+        Remember the user that the credentials of the request in
+        *environ*, which has been handled, authenticated, if any.
+        """
+        authorization = environ.get('HTTP_AUTHORIZATION')
+        identity = environ.get(IDENTITY_KEY) or {}
+        userid = identity.get(USERID_KEY)
+        if authorization and userid:
+            self._userids[authorization] = userid
+
+    def clear(self):
+        self._userids.clear()
@@ -13,29 +13,178 @@ from __future__ import absolute_import
 # disable: accessing protected members, too many methods
 # pylint: disable=W0212,R0904
 
+import os
+
 from paste.exceptions.errormiddleware import ErrorMiddleware
 
 from webtest import TestApp as _TestApp
 
+from nti.app.testing.allocations import require_tracemalloc
+from nti.app.testing.allocations import measure_allocations
+from nti.app.testing.allocations import trace_allocations_enabled
+
+from nti.app.testing.cache_reset import CacheResetStats
+from nti.app.testing.cache_reset import parse_cache_reset_policy
+
+from nti.app.testing.profiling import watch_endpoints
+from nti.app.testing.profiling import profiles_for
+from nti.app.testing.profiling import profile_directory
+
+from nti.app.testing.recording import recorded_environ
+from nti.app.testing.recording import traffic_recorder
+
+from nti.app.testing.redis_client import CountingRedisClient
+
+from nti.app.testing.testing import patch_webtest
+
+from nti.app.testing.trusted_auth import TrustedPrincipals
+from nti.app.testing.trusted_auth import trusted_auth_enabled
+
+from nti.app.testing.zodb_stats import ZODB_STATS_KEY
+from nti.app.testing.zodb_stats import measure_request
+from nti.app.testing.zodb_stats import zodb_stats_enabled
+
 from nti.dataserver.tests import mock_dataserver
 
 from nti.wsgi.cors import cors_filter_factory as CORSInjector
 from nti.wsgi.cors import cors_option_filter_factory as CORSOptionHandler
 
+#: The key in the WSGI environment of a request under which
+#: :class:`_RedisCallsMiddleware` stores a :class:`collections.Counter`
+#: of the redis commands the request issued.
+REDIS_CALLS_KEY = 'nti.app.testing.redis_calls'
+
+#: The key in the WSGI environment of a request under which
+#: :class:`_ZODBGCMiddleware` stores whether it reset the caches
+#: after the request, and how many evicted objects the request
+#: loaded again (see :class:`nti.app.testing.cache_reset.CacheResetStats`).
+CACHE_RESET_KEY = 'nti.app.testing.zodb_cache_reset'
+
+#: The key in the WSGI environment of a request under which
+#: :class:`_AllocationsMiddleware` stores the
+#: :class:`nti.app.testing.allocations.AllocationStats` of the request.
+ALLOCATION_STATS_KEY = 'nti.app.testing.allocation_stats'
+
+#: The name of an environment variable. If it is set to a non-empty
+#: value, test apps send the auth_tkt cookie that the application set
+#: when a user first authenticated instead of their ``Authorization``
+#: header; see :func:`TestApp`.
+REUSE_AUTH_COOKIE_ENV = 'NTI_APP_TESTING_REUSE_AUTH_COOKIE'
+
 logger = __import__('logging').getLogger(__name__)
 
 
 class _ZODBGCMiddleware(object):
+    """
+    Resets the ZODB caches after requests, as directed by
+    a policy from :mod:`nti.app.testing.cache_reset`.
+    """
+
+    def __init__(self, app, policy=None):
+        self.app = app
+        self.policy = parse_cache_reset_policy(policy)
+        self.stats = CacheResetStats()
+
+    def __call__(self, environ, start_response):
+        result = self.app(environ, start_response)
+        db = getattr(mock_dataserver.current_mock_ds, 'db', None)
+        reset = self.policy.should_reset(db)
+        environ[CACHE_RESET_KEY] = self.stats.record(db, reset)
+        if reset:
+            self.stats.before_reset(db)
+            mock_dataserver.reset_db_caches()
+        return result
+
+
+class _ZODBStatsMiddleware(object):
+    """
+    Measures the loads, stores and commits of each request
+    made with a current mock dataserver.
+    """
 
     def __init__(self, app):
         self.app = app
 
-    def __call__(self, *args, **kwargs):
-        result = self.app(*args, **kwargs)
-        mock_dataserver.reset_db_caches()
+    def __call__(self, environ, start_response):
+        db = getattr(mock_dataserver.current_mock_ds, 'db', None)
+        if db is None:
+            return self.app(environ, start_response)
+        result, stats = measure_request(db, self.app, environ, start_response)
+        environ[ZODB_STATS_KEY] = stats
         return result
 
 
+class _RedisCallsMiddleware(object):
+    """
+    If the redis client of the current mock dataserver is counting
+    its commands (see :func:`nti.app.testing.redis_client.count_redis_calls`),
+    record those issued while handling each request in the
+    environment.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        ds = mock_dataserver.current_mock_ds
+        client = getattr(ds, 'redis', None)
+        if not isinstance(client, CountingRedisClient):
+            return self.app(environ, start_response)
+        before = client.calls.copy()
+        try:
+            return self.app(environ, start_response)
+        finally:
+            environ[REDIS_CALLS_KEY] = client.calls - before
+
+
+class _ProfilingMiddleware(object):
+    """
+    Profiles each request; see :mod:`nti.app.testing.profiling`.
+    """
+
+    def __init__(self, app, profiles=None):
+        self.app = app
+        self.profiles = profiles if profiles is not None else profiles_for()
+
+    def __call__(self, environ, start_response):
+        return self.profiles.profile(self.app, environ, start_response)
+
+
+class _AllocationsMiddleware(object):
+    """
+    Traces the memory allocated by each request; see
+    :mod:`nti.app.testing.allocations`.
+    """
+
+    def __init__(self, app):
+        require_tracemalloc()
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        result, stats = measure_allocations(self.app, environ, start_response)
+        environ[ALLOCATION_STATS_KEY] = stats
+        return result
+
+
+class _TrustedAuthMiddleware(object):
+    """
+    Identifies requests whose credentials authenticated before without
+    authenticating them again; see :mod:`nti.app.testing.trusted_auth`.
+    """
+
+    def __init__(self, app, principals=None):
+        self.app = app
+        self.principals = principals if principals is not None else TrustedPrincipals()
+
+    def __call__(self, environ, start_response):
+        if self.principals.trust(environ):
+            return self.app(environ, start_response)
+        try:
+            return self.app(environ, start_response)
+        finally:
+            self.principals.learn(environ)
+
+
 class _UnicodeTestApp(_TestApp):
     """
     To make using unicode literals easier
@@ -59,6 +208,76 @@ class _UnicodeTestApp(_TestApp):
 
     del _make_
 
+    def __init__(self, *args, **kwargs):
+        patch_webtest()
+        super(_UnicodeTestApp, self).__init__(*args, **kwargs)
+
+    _recording_session = None
+
+    def do_request(self, req, *args, **kwargs):
+        if not traffic_recorder.enabled:
+            return self._do_request(req, *args, **kwargs)
+
+        if self._recording_session is None:
+            self._recording_session = traffic_recorder.new_session()
+        method, path = req.method, req.path_qs
+        environ = recorded_environ(req.environ)
+        body = req.body
+        res = self._do_request(req, *args, **kwargs)
+        traffic_recorder.record(self._recording_session, method, path,
+                                environ, body, res.status_int)
+        return res
+
+    #: Whether to send the auth_tkt cookie set for an ``Authorization``
+    #: header instead of that header.
+    reuse_auth_cookie = False
+    _auth_cookies = None
+
+    def reset(self):
+        super(_UnicodeTestApp, self).reset()
+        self._auth_cookies = None
+
+    def _jar_auth_cookies(self):
+        return dict((k, v) for k, v in self.cookies.items()
+                    if k.endswith('auth_tkt'))
+
+    def _use_auth_cookies(self, req, cookies):
+        # Like a browser that logged in: the cookie, not the credentials.
+        # The other cookies in the jar go along, as webtest won't add
+        # them to a request that already has a Cookie header.
+        del req.environ['HTTP_AUTHORIZATION']
+        sent = dict((k, v) for k, v in self.cookies.items()
+                    if not k.endswith('auth_tkt'))
+        sent.update(cookies)
+        req.environ['HTTP_COOKIE'] = str('; '.join('%s=%s' % item
+                                                   for item in sorted(sent.items())))
+
+    def _do_request(self, req, *args, **kwargs):
+        authorization = cookies = None
+        if self.reuse_auth_cookie:
+            if self._auth_cookies is None:
+                self._auth_cookies = {}
+            authorization = req.environ.get('HTTP_AUTHORIZATION')
+            before = self._jar_auth_cookies()
+            # Forgotten unless the request succeeds, so a rejected
+            # cookie means authenticating again
+            cookies = self._auth_cookies.pop(authorization, None)
+            if cookies and 'HTTP_COOKIE' not in req.environ:
+                self._use_auth_cookies(req, cookies)
+        res = super(_UnicodeTestApp, self).do_request(req, *args, **kwargs)
+        if authorization and res.status_int < 400:
+            # The application may have set (or reissued) the cookie
+            after = self._jar_auth_cookies()
+            cookies = after if after != before else cookies
+            if cookies:
+                self._auth_cookies[authorization] = cookies
+        # A Counter of the redis commands, if they were counted
+        res.redis_calls = req.environ.get(REDIS_CALLS_KEY)
+        res.zodb_cache_reset = req.environ.get(CACHE_RESET_KEY)
+        res.zodb_stats = req.environ.get(ZODB_STATS_KEY)
+        res.allocation_stats = req.environ.get(ALLOCATION_STATS_KEY)
+        return res
+
 _TestApp = _UnicodeTestApp
 
 
@@ -77,20 +296,82 @@ class _PasteTestingMiddleware(object):
         return self.app(environ, start_response)
 
 
-def TestApp(app, **kwargs):
+def TestApp(app, cache_reset_policy=None, profile_dir=None,
+            trace_allocations=None, reuse_auth_cookie=None, trusted_auth=None,
+            middleware=None, zodb_stats=None, **kwargs):
     """
     Sets up the pipeline just like in real life.
 
+    :keyword cache_reset_policy: When to reset the ZODB caches after
+        a request; see :func:`nti.app.testing.cache_reset.parse_cache_reset_policy`.
+        The statistics of the resets are available as the
+        ``zodb_cache_stats`` attribute of the result.
+    :keyword bool zodb_stats: If true, measure the objects each request
+        loads and stores and its commits, and attach the results to the
+        responses as ``zodb_stats``. Defaults to the value of the
+        environment variable named by
+        :data:`nti.app.testing.zodb_stats.ZODB_STATS_ENV`.
+    :keyword str profile_dir: If given, profile each request, and write
+        the profiles to this directory when the process exits, added up
+        with those of the other test apps given the same directory; it
+        has no effect on other test apps. Profiling is also enabled by the
+        environment variable named by
+        :data:`nti.app.testing.profiling.PROFILE_DIR_ENV`.
+    :keyword bool trace_allocations: If true, trace the memory allocated
+        by each request, and attach the results to the responses as
+        ``allocation_stats``. Defaults to the value of the environment
+        variable named by
+        :data:`nti.app.testing.allocations.TRACE_ALLOCATIONS_ENV`.
+        Passing true on Python 2 raises :exc:`NotImplementedError`.
+    :keyword bool reuse_auth_cookie: If true, once a request with an
+        ``Authorization`` header succeeds and the application sets an auth_tkt
+        cookie, later requests with that header send the cookie instead, so
+        they don't pay for checking the password again. Defaults to the
+        value of the environment variable named by :data:`REUSE_AUTH_COOKIE_ENV`.
+    :keyword bool trusted_auth: If true, once credentials have authenticated,
+        later requests with them are identified as that user without
+        checking them; see :mod:`nti.app.testing.trusted_auth`. Defaults
+        to the value of the environment variable named by
+        :data:`nti.app.testing.trusted_auth.TRUSTED_AUTH_ENV`.
+    :keyword middleware: If given, a callable that is passed the WSGI
+        pipeline and returns the WSGI application to test, typically
+        a middleware wrapping it. It is outermost, so it sees the
+        environment keys that the rest of the pipeline sets, such as
+        :data:`nti.app.testing.zodb_stats.ZODB_STATS_KEY` (if
+        *zodb_stats* is true), once the request is done.
     :return: A WebTest testapp.
     """
+    # The Pyramid router, if that's what we were given
+    registry = getattr(app, 'registry', None)
+    app = _PasteTestingMiddleware(app)
+    if trusted_auth is None:
+        trusted_auth = trusted_auth_enabled()
+    if trusted_auth:
+        app = _TrustedAuthMiddleware(app)
+    if zodb_stats is None:
+        zodb_stats = zodb_stats_enabled()
+    if zodb_stats:
+        app = _ZODBStatsMiddleware(app)
+    gc_middleware = _ZODBGCMiddleware(app, cache_reset_policy)
+    pipeline = _RedisCallsMiddleware(gc_middleware)
+    if trace_allocations is None:
+        trace_allocations = trace_allocations_enabled()
+    if trace_allocations:
+        pipeline = _AllocationsMiddleware(pipeline)
+    if profile_dir or profile_directory():
+        watch_endpoints(registry)
+        pipeline = _ProfilingMiddleware(pipeline, profiles_for(profile_dir))
     # TODO: Load from paste?
-    return _TestApp(
-        CORSInjector(
-            CORSOptionHandler(
-                ErrorMiddleware(
-                    _ZODBGCMiddleware(
-                        _PasteTestingMiddleware(app)),
-                    debug=True))),
-        **kwargs)
+    pipeline = CORSInjector(
+        CORSOptionHandler(
+            ErrorMiddleware(pipeline, debug=True)))
+    if middleware is not None:
+        pipeline = middleware(pipeline)
+    result = _TestApp(pipeline, **kwargs)
+    result.zodb_cache_stats = gc_middleware.stats
+    if reuse_auth_cookie is None:
+        reuse_auth_cookie = bool(os.environ.get(REUSE_AUTH_COOKIE_ENV))
+    result.reuse_auth_cookie = reuse_auth_cookie
+    return result
 
 TestApp.__test__ = False  # make nose not call this
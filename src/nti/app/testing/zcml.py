@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Caching of the ZCML configuration actions produced when
+creating the application.
+
+Creating the application parses every ZCML file of every included
+package and then executes the resulting actions. When a layer with
+the same configuration is created again in the same process (for
+example, after a different layer has been run and torn the component
+registry down), the parsing produces exactly the same action list.
+The :class:`ZCMLActionCache` remembers the resolved actions of the
+first creation and replays them for later creations, skipping the
+XML parsing entirely, so long as none of the included files have
+changed.
+
+The actions contain arbitrary callables, including classes created
+while parsing, so they cannot be persisted between processes.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import os
+import time
+import hashlib
+import contextlib
+
+from zope.configuration.config import ConfigurationContext
+from zope.configuration.config import ConfigurationAdapterRegistry
+from zope.configuration.config import ConfigurationMachine
+
+__test__ = False
+
+#: The name of an environment variable. If it is set to a non-empty
+#: value, the actions of application ZCML configuration are cached
+#: and replayed.
+ACTION_CACHE_ENV = 'NTI_APP_TESTING_CACHE_ZCML'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def action_cache_enabled():
+    return bool(os.environ.get(ACTION_CACHE_ENV))
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class _FileValidator(object):
+    """
+    Records the modification time and hash of a set of files.
+    """
+
+    def __init__(self, paths):
+        self.stats = {}
+        for path in paths:
+            stat = os.stat(path)
+            self.stats[path] = (stat.st_mtime, stat.st_size, _file_hash(path))
+
+    def is_valid(self):
+        for path, (mtime, size, digest) in list(self.stats.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return False
+            if stat.st_mtime == mtime and stat.st_size == size:
+                continue
+            # Touched, but maybe not changed
+            if stat.st_size != size or _file_hash(path) != digest:
+                return False
+            self.stats[path] = (stat.st_mtime, size, digest)
+        return True
+
+
+#: Stands in the recorded action list for an action that
+#: did not come from an included file.
+_FRESH = object()
+
+
+class _CacheEntry(object):
+
+    def __init__(self):
+        #: A list of action lists, one per call to ``execute_actions``
+        self.executions = []
+        self.seen_files = set()
+        self.features = set()
+        #: The directives defined while parsing, as ``(method, args)``
+        #: calls of :class:`ConfigurationAdapterRegistry`
+        self.directives = []
+        self.validator = None
+        self.parse_time = None
+
+
+class ZCMLActionCache(object):
+    """
+    Caches resolved configuration actions keyed by an arbitrary
+    hashable object describing the configuration.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        #: Maps keys to a list of ``(parsed, seconds)`` pairs, one
+        #: for each configuration done.
+        self.timings = {}
+
+    def clear(self):
+        self._entries.clear()
+        self.timings.clear()
+
+    def _valid_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and not entry.validator.is_valid():
+            logger.info("ZCML files changed; discarding cached actions for %s",
+                        key)
+            del self._entries[key]
+            entry = None
+        return entry
+
+    @contextlib.contextmanager
+    def configuring(self, key):
+        """
+        A context manager to wrap around the creation of the application
+        for the configuration identified by *key*.
+
+        The first time it is used for *key*, the actions executed by
+        any :class:`zope.configuration.config.ConfigurationMachine` in the
+        body are recorded. Subsequently, included files are not processed,
+        and the recorded actions are executed instead.
+        """
+        entry = self._valid_entry(key)
+        if entry is None:
+            entry = _CacheEntry()
+            patches = self._recording_patches(entry)
+        else:
+            patches = self._replaying_patches(entry)
+
+        parsed = entry.validator is None
+        originals = {}
+        for (kind, name), func in patches.items():
+            originals[(kind, name)] = kind.__dict__.get(name)
+            setattr(kind, name, func)
+        start = time.time()
+        try:
+            yield
+        except Exception:
+            # Whatever we had is suspect
+            self._entries.pop(key, None)
+            raise
+        finally:
+            for (kind, name), func in originals.items():
+                if func is None:
+                    delattr(kind, name)
+                else:
+                    setattr(kind, name, func)
+
+        duration = time.time() - start
+        self.timings.setdefault(key, []).append((parsed, duration))
+        if parsed:
+            entry.validator = _FileValidator(entry.seen_files)
+            entry.parse_time = duration
+            self._entries[key] = entry
+        else:
+            logger.info("Configured %s from cached ZCML actions in %.2fs "
+                        "(%.2fs when parsed, saving %.2fs)",
+                        key, duration, entry.parse_time,
+                        entry.parse_time - duration)
+
+    @staticmethod
+    def _recording_patches(entry):
+        orig_execute_actions = ConfigurationMachine.execute_actions
+
+        def execute_actions(self, *args, **kwargs):
+            seen = set(self._seen_files)
+            recorded = []
+            for action in self.actions:
+                info_file = getattr(action.get('info'), 'file', None)
+                recorded.append(action if info_file in seen else _FRESH)
+            entry.executions.append(recorded)
+            entry.seen_files.update(seen)
+            entry.features.update(self._features)
+            return orig_execute_actions(self, *args, **kwargs)
+
+        def directive_recorder(name):
+            orig = getattr(ConfigurationAdapterRegistry, name)
+
+            def record(self, *args):
+                entry.directives.append((name, args))
+                return orig(self, *args)
+            return record
+
+        return {(ConfigurationMachine, 'execute_actions'): execute_actions,
+                (ConfigurationAdapterRegistry, 'register'): directive_recorder('register'),
+                (ConfigurationAdapterRegistry, 'document'): directive_recorder('document')}
+
+    @staticmethod
+    def _replaying_patches(entry):
+        orig_execute_actions = ConfigurationMachine.execute_actions
+        # ``<include>`` asks the grouping context it creates, not the
+        # machine, so this has to be patched where they both get it
+        orig_processFile = ConfigurationContext.processFile
+        executions = iter(entry.executions)
+
+        def processFile(self, filename):
+            path = self.path(filename)
+            if path in entry.seen_files:
+                # Pretend we've already processed it; in effect, we have,
+                # and all the files it includes. The first time, define
+                # the directives they defined, for the files we do parse.
+                if not self._seen_files >= entry.seen_files:
+                    self._seen_files.update(entry.seen_files)
+                    self._features.update(entry.features)
+                    for name, args in entry.directives:
+                        getattr(self, name)(*args)
+                return False
+            return orig_processFile(self, filename)
+
+        def execute_actions(self, *args, **kwargs):
+            recorded = next(executions, None)
+            fresh = [a for a in self.actions
+                     if getattr(a.get('info'), 'file', None) not in entry.seen_files]
+            if recorded is None or recorded.count(_FRESH) != len(fresh):
+                raise AssertionError("ZCML configuration no longer matches "
+                                     "the cached actions; clear the cache")
+            fresh = iter(fresh)
+            self.actions[:] = [next(fresh) if a is _FRESH else a
+                               for a in recorded]
+            return orig_execute_actions(self, *args, **kwargs)
+
+        return {(ConfigurationMachine, 'execute_actions'): execute_actions,
+                (ConfigurationContext, 'processFile'): processFile}
+
+
+#: The cache used when creating applications in this process.
+action_cache = ZCMLActionCache()
+
+
+@contextlib.contextmanager
+def cached_actions(key, enabled=None):
+    """
+    Use :data:`action_cache` for the configuration done in the body
+    if *enabled* is true, otherwise do nothing. By default, *enabled* is
+    the value of :func:`action_cache_enabled`.
+
+    :class:`~zope.configuration.config.ConfigurationMachine` is only
+    patched while the body runs, and only if the cache is used.
+    """
+    if enabled is None:
+        enabled = action_cache_enabled()
+    if not enabled:
+        yield
+        return
+    with action_cache.configuring(key):
+        yield
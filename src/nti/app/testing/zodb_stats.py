@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measuring the ZODB activity of individual requests.
+
+When enabled, the pipeline built by
+:func:`nti.app.testing.webtest.TestApp` attaches a
+:class:`ZODBRequestStats` to each response as ``zodb_stats``; matchers
+like :func:`nti.app.testing.matchers.loads_at_most` check it.
+
+Enable it by setting the environment variable named by
+:data:`ZODB_STATS_ENV`, or by passing ``zodb_stats`` to ``TestApp``.
+
+The loads and stores come from the transfer counts of the
+connections, which the activity monitor of a database, if it has one,
+clears when a connection closes. What a connection did before its
+counts were cleared during a request is lost; such requests are
+marked as ``cleared`` and the matchers fail for them rather than
+passing with counts that are too low.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# disable: accessing protected members, too many methods
+# pylint: disable=W0212,R0904
+
+import os
+import time
+
+import transaction
+
+__test__ = False
+
+#: The key in the WSGI environment of a request under which the
+#: pipeline built by :func:`nti.app.testing.webtest.TestApp` stores
+#: the :class:`ZODBRequestStats` of the request.
+ZODB_STATS_KEY = 'nti.app.testing.zodb_stats'
+
+#: The name of an environment variable. If it is set to a non-empty
+#: value, the ZODB activity of all test requests is measured.
+ZODB_STATS_ENV = 'NTI_APP_TESTING_ZODB_STATS'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def zodb_stats_enabled():
+    return bool(os.environ.get(ZODB_STATS_ENV))
+
+
+def connection_transfer_counts(db):
+    """
+    Return a dictionary from each connection of *db* to its
+    ``(loads, stores)``, suitable as the *since* argument of
+    :func:`transfer_counts`.
+    """
+    counts = {}
+
+    def add(conn):
+        counts[conn] = conn.getTransferCounts()
+    db._connectionMap(add)
+    return counts
+
+
+def _transfer_counts(db, since):
+    since = since or {}
+    loads = stores = 0
+    cleared = False
+    for conn, (conn_loads, conn_stores) in connection_transfer_counts(db).items():
+        before_loads, before_stores = since.get(conn, (0, 0))
+        if conn_loads < before_loads or conn_stores < before_stores:
+            # Only what it did since then is known
+            cleared = True
+            before_loads = before_stores = 0
+        loads += conn_loads - before_loads
+        stores += conn_stores - before_stores
+    return loads, stores, cleared
+
+
+def transfer_counts(db, since=None):
+    """
+    Return the total number of objects loaded and stored by all the
+    connections of *db* since they were opened, or, if *since* is
+    the result of an earlier :func:`connection_transfer_counts`, since
+    then.
+
+    Each connection is compared with itself: a connection opened since
+    counts from zero, and one whose counts were cleared in the meantime
+    (as the activity monitor of a database does when connections close)
+    counts only what it did after they were, so the totals may be too
+    low, but never negative. :func:`measure_request` notes when that
+    happened.
+    """
+    return _transfer_counts(db, since)[:2]
+
+
+class ZODBRequestStats(object):
+    """
+    The ZODB activity of one request.
+
+    ``loads`` counts the objects that were not in the cache of their
+    connection and so were read from storage; objects found in the cache
+    aren't counted by ZODB. ``cached`` is the number of (non-ghost) objects
+    in the caches once the request was done.
+
+    ``cleared`` is true if the transfer counts of a connection were
+    cleared during the request; ``loads`` and ``stores`` then only
+    count what that connection did afterwards.
+    """
+
+    loads = 0
+    stores = 0
+    cleared = False
+    cached = None
+    commits = 0
+    commit_time = 0.0
+
+    def to_dict(self):
+        return {
+            'loads': self.loads,
+            'stores': self.stores,
+            'cleared': self.cleared,
+            'cached': self.cached,
+            'commits': self.commits,
+            'commit_time': self.commit_time,
+        }
+
+    def __repr__(self):
+        return '<%s loads=%s stores=%s%s commits=%s commit_time=%.4fs>' % (
+            type(self).__name__, self.loads, self.stores,
+            ' (cleared)' if self.cleared else '',
+            self.commits, self.commit_time)
+
+
+class _CommitTimer(object):
+    """
+    A transaction synchronizer timing the commits of a
+    :class:`ZODBRequestStats`.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self._start = None
+
+    def newTransaction(self, txn):
+        pass
+
+    def beforeCompletion(self, txn):
+        self._start = time.time()
+
+    def afterCompletion(self, txn):
+        if self._start is None:  # pragma: no cover
+            return
+        duration = time.time() - self._start
+        self._start = None
+        if txn.status == 'Committed':
+            self.stats.commits += 1
+            self.stats.commit_time += duration
+
+
+def measure_request(db, app, environ, start_response):
+    """
+    Call the WSGI *app* and return its result and the
+    :class:`ZODBRequestStats` of the request.
+    """
+    stats = ZODBRequestStats()
+    timer = _CommitTimer(stats)
+    before = connection_transfer_counts(db)
+    transaction.manager.registerSynch(timer)
+    try:
+        result = app(environ, start_response)
+    finally:
+        transaction.manager.unregisterSynch(timer)
+        stats.loads, stats.stores, stats.cleared = _transfer_counts(db, before)
+        stats.cached = db.cacheSize()
+    return result, stats